@@ -1,12 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.api.main import api_router
 from src.config import s
+from src.llm.checkpointer import close_checkpointer, open_checkpointer
+from src.llm.query_log import stop_query_log
+from src.order.client import order_client
+from src.warmup import warm_up
 import logging
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Chatbot API", description="API for the chatbot")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the conversation store binds to the running event loop, open it before anything uses the agent
+    await open_checkpointer()
+    # warm up in the background so liveness answers at once; readiness flips when it is done
+    warmup_task = asyncio.create_task(warm_up())
+    yield
+    warmup_task.cancel()
+    # let the warm-up unwind before the connections it may be using are closed
+    with suppress(asyncio.CancelledError):
+        await warmup_task
+    # release pooled connections to the order service
+    await order_client.close()
+    await close_checkpointer()
+    stop_query_log()
+
+
+app = FastAPI(title="Chatbot API", description="API for the chatbot", lifespan=lifespan)
 
 # Update CORS middleware with specific settings
 app.add_middleware(
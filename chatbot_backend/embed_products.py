@@ -1,50 +1,136 @@
-import csv
-import os
-from src.models.product import Product
-from src.llm.embedding import embed_product
+import argparse
+import asyncio
+import logging
+from typing import AsyncIterator, Iterable, Iterator
+
+import tiktoken
+from src.config import s
+from src.database.catalog import Catalog, ProductRecord
+from src.database.products import products as catalog
+from src.llm.embedding import EMBEDDING_KEY, embed_texts
 from tqdm import tqdm
-from src.database.pipecone_client import pineconeClient
-
-
-def read_products_from_csv(file_path: str) -> list[Product]:
-    products = []
-    with open(file_path, 'r') as file:
-        reader = csv.reader(file)
-        headers = next(reader)  # Get the header row
-        for row in reader:
-            try:
-                product = Product.from_csv_row(row, headers)
-                products.append(product)
-            except Exception as e:
-                print(f"Error processing row: {row}")
-                print(f"Error: {str(e)}")
-                continue
-    return products
-
-# TODO: multiple process
-async def embed_products(products: list[Product]):
-    embedded_products = []
-    for idx, product in tqdm(enumerate(products)):
-        embedding = await embed_product(product)
-        embedded_products.append({
-            "id": idx+1,
+from src.database.manifest import EmbeddingManifest, metadata_hash, text_hash
+from src.database.pinecone_client import pineconeClient
+
+logger = logging.getLogger(__name__)
+
+MAX_INPUT_TOKENS = 8191  # per-input limit of the text-embedding-3 models
+
+encoding = tiktoken.get_encoding("cl100k_base")
+
+
+def iter_products(catalog: Catalog) -> Iterator[tuple[str, ProductRecord]]:
+    """(id, product) pairs keyed by the stable product id, so ids survive re-ingestion of a changed CSV."""
+    for product in catalog.indexed():
+        yield product.product_id, product
+
+
+def select_changes(
+    products: Iterable[tuple[str, ProductRecord]],
+    manifest: EmbeddingManifest,
+    full: bool,
+    hashes: dict[str, tuple[str, str]],
+    metadata_updates: list[dict],
+) -> Iterator[tuple[str, ProductRecord]]:
+    """
+    Yield the products whose embedded text is new or changed.
+    Products with only a metadata change are appended to `metadata_updates`; the hashes of
+    every product seen are recorded in `hashes` so removed ids and the manifest can be resolved.
+    """
+    for product_id, product in products:
+        metadata = product.metadata()
+        text_h, meta_h = text_hash(product), metadata_hash(metadata)
+        hashes[str(product_id)] = (text_h, meta_h)
+        change = "new" if full else manifest.diff(str(product_id), text_h, meta_h)
+        if change in {"new", "text"}:
+            yield product_id, product
+        elif change == "meta":
+            metadata_updates.append({"id": product_id, "metadata": metadata})
+
+
+def batch_by_tokens(
+    products: Iterable[tuple[str, ProductRecord]], max_tokens: int, max_size: int
+) -> Iterator[list[tuple[str, ProductRecord, str]]]:
+    """Pack products into embeddings requests bounded by total token count and number of inputs."""
+    batch, batch_tokens = [], 0
+    for product_id, product in products:
+        tokens = encoding.encode(product.get_product_info())[:MAX_INPUT_TOKENS]
+        if batch and (batch_tokens + len(tokens) > max_tokens or len(batch) == max_size):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append((product_id, product, encoding.decode(tokens)))
+        batch_tokens += len(tokens)
+    if batch:
+        yield batch
+
+
+async def embed_batch(batch: list[tuple[str, ProductRecord, str]]) -> list[dict]:
+    embeddings = await embed_texts([text for _, _, text in batch])
+    return [
+        {
+            "id": product_id,
             "embedded_vector": embedding,
-            "metadata": {
-                "price": product.price,
-                "average_rating": product.average_rating,
-                "rating_number": product.rating_number,
-            }
-        })
+            "metadata": product.metadata(),
+        }
+        for (product_id, product, _), embedding in zip(batch, embeddings)
+    ]
+
+
+async def embed_products(
+    batches: Iterable[list[tuple[str, ProductRecord, str]]], concurrency: int
+) -> AsyncIterator[list[dict]]:
+    """
+    Embed batches with at most `concurrency` requests in flight, yielding each batch as soon as it completes.
+    Batches are pulled from the iterable lazily, so the catalogue is never held in memory.
+    """
+    pending = set()
+    for batch in batches:
+        pending.add(asyncio.create_task(embed_batch(batch)))
+        if len(pending) >= concurrency:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
+
+
+async def main(full: bool = False):
+    manifest = EmbeddingManifest(s.embedding_manifest_path, EMBEDDING_KEY)
+    if manifest.embedding_changed and not full:
+        logger.info(f"Embedding model or size changed to {EMBEDDING_KEY}, re-embedding every product")
+        full = True
+    hashes: dict[str, tuple[str, str]] = {}
+    metadata_updates: list[dict] = []
 
-    return embedded_products
+    changed = select_changes(iter_products(catalog), manifest, full, hashes, metadata_updates)
+    batches = batch_by_tokens(changed, s.embedding_batch_max_tokens, s.embedding_batch_max_size)
+    try:
+        with tqdm(unit="product") as progress:
+            async for records in embed_products(batches, s.embedding_concurrency):
+                # upsert is a blocking gRPC call, keep the event loop free for the in-flight embeddings
+                await asyncio.to_thread(pineconeClient.upsert_products, records, "products")
+                for record in records:
+                    manifest.set(str(record["id"]), *hashes[str(record["id"])])
+                progress.update(len(records))
 
+        await asyncio.to_thread(pineconeClient.update_metadata, metadata_updates, "products")
+        for record in metadata_updates:
+            manifest.set(str(record["id"]), *hashes[str(record["id"])])
 
-async def main():
-    products = read_products_from_csv(os.path.join(os.path.dirname(__file__), "Product_Information_Dataset.csv"))
-    products = await embed_products(products)
-    pineconeClient.upsert_products(products, "products")
+        removed = [product_id for product_id in manifest.entries if product_id not in hashes]
+        await asyncio.to_thread(pineconeClient.delete_products, removed, "products")
+        manifest.remove(removed)
+        logger.info(f"Sync done: {progress.n} embedded, {len(metadata_updates)} metadata updates, {len(removed)} deleted")
+    finally:
+        # keep the progress of a partial run so a re-run resumes instead of starting over
+        manifest.save()
+        pineconeClient.persist()
 
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Embed the product catalogue into the vector index")
+    parser.add_argument("--full", action="store_true", help="re-embed every product, ignoring the manifest")
+    args = parser.parse_args()
+    asyncio.run(main(full=args.full))
@@ -0,0 +1,102 @@
+"""
+Offline recall@k of reduced-size product embeddings against full-precision search.
+
+Ground truth is exact cosine search over the full float32 vectors of the local index, so build
+it at the model's native size first (VECTOR_STORE=local python embed_products.py --full). Each
+setting truncates the same vectors to its first `dims` dimensions (what text-embedding-3
+returns for `dimensions=dims`, up to normalisation), optionally int8-quantizes them with float
+re-ranking like LocalNamespace, and is scored by the overlap of its top k with the ground truth.
+
+    python evaluate_embeddings.py --dims 256 512 1024 --queries queries.txt
+"""
+import argparse
+import asyncio
+
+import numpy as np
+
+from src.config import s
+from src.database.local_index import int8_scores, quantize_int8
+from src.llm.embedding import openai_client
+
+BATCH = 64  # queries scored per matrix product
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+
+
+def top_k(scores: np.ndarray, k: int, exclude: np.ndarray = None) -> np.ndarray:
+    """Row-wise indices of the k best columns of a (queries, products) score matrix."""
+    if exclude is not None:
+        scores[np.arange(len(scores)), exclude] = -np.inf
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def search(vectors, queries, k, exclude, codes=None, scales=None, rerank_factor=4) -> np.ndarray:
+    results = []
+    for start in range(0, len(queries), BATCH):
+        batch = queries[start : start + BATCH]
+        batch_exclude = None if exclude is None else exclude[start : start + BATCH]
+        if codes is None:
+            results.append(top_k(batch @ vectors.T, k, batch_exclude))
+            continue
+        shortlist = top_k(int8_scores(codes, scales, batch).T, k * rerank_factor, batch_exclude)
+        exact = np.einsum("qkd,qd->qk", vectors[shortlist], batch)
+        order = np.argsort(-exact, axis=1)[:, :k]
+        results.append(np.take_along_axis(shortlist, order, axis=1))
+    return np.vstack(results)
+
+
+def recall(results: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+
+async def embed_queries_full(texts: list[str], dims: int) -> np.ndarray:
+    response = await openai_client.embeddings.create(
+        model=s.openai_embedding_model, input=texts, dimensions=dims
+    )
+    return np.array([d.embedding for d in sorted(response.data, key=lambda d: d.index)], dtype=np.float32)
+
+
+def main(dims: list[int], k: int, sample: int, queries_path: str = None, seed: int = 0):
+    vectors = np.load(s.local_index_dir / "products.vectors.npy", mmap_mode="r")
+    vectors = normalize(np.asarray(vectors, dtype=np.float32))
+    full_dims = vectors.shape[1]
+    print(f"{len(vectors)} products, {full_dims} dimensions")
+
+    if queries_path:
+        with open(queries_path) as f:
+            texts = [line.strip() for line in f if line.strip()]
+        queries = normalize(asyncio.run(embed_queries_full(texts, full_dims)))
+        exclude = None
+    else:
+        # products as queries, each excluded from its own results
+        exclude = np.random.default_rng(seed).choice(len(vectors), size=min(sample, len(vectors)), replace=False)
+        queries = vectors[exclude]
+
+    truth = search(vectors, queries, k, exclude)
+    print(f"{'dims':>6} {'storage':>8} {'bytes/vector':>13} {f'recall@{k}':>10}")
+    for d in sorted(dims):
+        if d > full_dims:
+            continue
+        truncated = normalize(vectors[:, :d])
+        truncated_queries = normalize(queries[:, :d])
+        float_recall = recall(search(truncated, truncated_queries, k, exclude), truth)
+        print(f"{d:>6} {'float32':>8} {d * 4:>13} {float_recall:>10.3f}")
+
+        codes, scales = quantize_int8(truncated)
+        int8_results = search(
+            truncated, truncated_queries, k, exclude, codes, scales, s.local_index_rerank_factor
+        )
+        print(f"{d:>6} {'int8':>8} {d + 4:>13} {recall(int8_results, truth):>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall of truncated / int8 embeddings against full-precision search")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 768, 1024, 1536])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=1000, help="products used as queries without --queries")
+    parser.add_argument("--queries", help="text file with one search query per line, embedded at full size")
+    args = parser.parse_args()
+    main(args.dims, args.k, args.sample, args.queries)
@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 
-from src.api.routes import chat
+from src.api.routes import chat, health, metrics
 
 api_router = APIRouter()
-api_router.include_router(chat.router)
\ No newline at end of file
+api_router.include_router(chat.router)
+api_router.include_router(metrics.router)
+api_router.include_router(health.router)
\ No newline at end of file
@@ -1,35 +1,190 @@
+import asyncio
 import json
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 
 from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
-from src.llm.chatbot import chat, create_agent
+from src.config import s
+from src.llm.chatbot import chat, chat_stream, get_agent
 import logging
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
-agent = create_agent()
-
 logger = logging.getLogger(__name__)
 
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+# session id -> [lock, number of requests holding or waiting for it]
+session_locks: dict[str, list] = {}
+# "<session id>:<idempotency key>" -> (future of the answer, created at)
+idempotent_turns: OrderedDict[str, tuple[asyncio.Future, float]] = OrderedDict()
+active_turns = 0
+chat_counters = {"admitted": 0, "rejected": 0, "deduplicated": 0}
+
+
+@asynccontextmanager
+async def session_lock(session_id: str):
+    """Serialize turns of one session; the lock is dropped once nobody holds or awaits it."""
+    entry = session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            session_locks.pop(session_id, None)
+
+
+def get_idempotent_turn(key: str) -> asyncio.Future | None:
+    now = time.monotonic()
+    while idempotent_turns:
+        oldest, (future, created_at) = next(iter(idempotent_turns.items()))
+        if now - created_at <= s.idempotency_ttl or not future.done():
+            break
+        del idempotent_turns[oldest]
+    entry = idempotent_turns.get(key)
+    return entry[0] if entry else None
+
+
+def start_idempotent_turn(key: str) -> asyncio.Future:
+    future = asyncio.get_running_loop().create_future()
+    idempotent_turns[key] = (future, time.monotonic())
+    return future
+
+
+def finish_idempotent_turn(key: str | None, future: asyncio.Future | None, answer: str | None):
+    """Publish the answer to retries, or forget the key on failure so a retry runs the turn again."""
+    if future is None or future.done():
+        return
+    if answer is None:
+        idempotent_turns.pop(key, None)
+        future.cancel()
+    else:
+        future.set_result(answer)
+
+
+def get_stream_mode(request: Request) -> str | None:
+    """
+    Resolve the incremental response mode from the `stream` query param or the Accept header.
+    Returns None for the legacy single JSON response.
+    """
+    mode = (request.query_params.get("stream") or "").lower()
+    if mode in STREAM_MEDIA_TYPES:
+        return mode
+    accept = request.headers.get("accept", "")
+    if "text/event-stream" in accept:
+        return "sse"
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    return None
+
+
+def format_frame(event: dict, mode: str) -> str:
+    """Encode one chat event as an NDJSON line or an SSE frame."""
+    if event["type"] == "token":
+        # keep the `message` key so NDJSON clients can simply concatenate the deltas
+        payload = {"type": "token", "message": event["content"]}
+    else:
+        payload = event
+    data = json.dumps(payload, default=str)
+    if mode == "sse":
+        return f"event: {payload['type']}\ndata: {data}\n\n"
+    return f"{data}\n"
+
+
+async def replay_turn(future: asyncio.Future, stream_mode: str | None):
+    """Answer a retried request from the turn already running or finished under its idempotency key."""
+    try:
+        answer = await asyncio.shield(future)
+    except asyncio.CancelledError:
+        answer = None
+    if answer is None:
+        error = {"type": "error", "message": "The original request failed, please retry"}
+        yield format_frame(error, stream_mode) if stream_mode else json.dumps(error)
+    elif stream_mode:
+        yield format_frame({"type": "token", "content": answer}, stream_mode)
+        yield format_frame({"type": "done", "answer": answer, "tool_calls": 0}, stream_mode)
+    else:
+        yield json.dumps({"message": answer})
+
 
 @router.post("/chat")
 async def chat_api(request: Request):
+    global active_turns
     try:
-        # Get session ID from query params
-        session_id = request.query_params.get("session_id") or "123" # session_id to chatbot continue with the same conversation
+        # session_id to chatbot continue with the same conversation; new conversations get a fresh one
+        session_id = request.query_params.get("session_id") or uuid.uuid4().hex
+        stream_mode = get_stream_mode(request)
+        headers = {"Connection": "keep-alive", "X-Session-Id": session_id}
+        if stream_mode:
+            headers["Cache-Control"] = "no-cache"
+        media_type = STREAM_MEDIA_TYPES[stream_mode] if stream_mode else "application/json"
 
-        # Get request body
-        body = await request.json()
-        message = body.get("message")
+        # validate before taking a concurrency slot or the idempotency key, so bad requests hold neither
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        message = body.get("message") if isinstance(body, dict) else None
+        if not isinstance(message, str):
+            return JSONResponse(
+                {"message": 'The request body must be a JSON object with a string "message"'},
+                status_code=400,
+                headers={"X-Session-Id": session_id},
+            )
+
+        idempotency_key = request.headers.get("idempotency-key")
+        turn_key = f"{session_id}:{idempotency_key}" if idempotency_key else None
+        if turn_key and (future := get_idempotent_turn(turn_key)) is not None:
+            chat_counters["deduplicated"] += 1
+            return StreamingResponse(replay_turn(future, stream_mode), media_type=media_type, headers=headers)
+
+        # shed load before the worker saturates; counted until the response is fully sent
+        if active_turns >= s.chat_max_concurrency:
+            chat_counters["rejected"] += 1
+            return JSONResponse(
+                {"message": "The assistant is busy, please retry shortly"},
+                status_code=429,
+                headers={"Retry-After": "1", "X-Session-Id": session_id},
+            )
+        active_turns += 1
+        chat_counters["admitted"] += 1
+        future = start_idempotent_turn(turn_key) if turn_key else None
+        released = False
+
+        def release(answer: str | None = None):
+            """
+            Free the slot and settle the idempotency key, once. Called when the body generator
+            ends, and as the response's background task for generators that never started
+            (e.g. the client went away first).
+            """
+            global active_turns
+            nonlocal released
+            if released:
+                return
+            released = True
+            active_turns -= 1
+            finish_idempotent_turn(turn_key, future, answer)
 
         async def generate():
+            answer = None
             try:
-                answer = await chat(
-                    message, session_id, agent
-                )
-                
+                async with session_lock(session_id):
+                    answer = await chat(
+                        message, session_id, get_agent()
+                    )
+
                 yield json.dumps(
                     {
                         "message": answer,
@@ -43,12 +198,40 @@ async def chat_api(request: Request):
                         "message": "An error occurred while processing your request",
                     }
                 )
+            finally:
+                release(answer)
+
+        async def generate_stream():
+            answer = None
+            try:
+                async with session_lock(session_id):
+                    async for event in chat_stream(message, session_id, get_agent()):
+                        if event["type"] == "done":
+                            answer = event["answer"]
+                        yield format_frame(event, stream_mode)
+            except Exception as e:
+                logger.exception("Error in generate_stream function")
+                yield format_frame(
+                    {
+                        "type": "error",
+                        "error": str(e),
+                        "message": "An error occurred while processing your request",
+                    },
+                    stream_mode,
+                )
+            finally:
+                release(answer)
 
-        return StreamingResponse(
-            generate(),
-            media_type="application/json",
-            headers={"Connection": "keep-alive"},
-        )
+        try:
+            return StreamingResponse(
+                generate_stream() if stream_mode else generate(),
+                media_type=media_type,
+                headers=headers,
+                background=BackgroundTask(release),
+            )
+        except Exception:
+            release()
+            raise
 
     except Exception as e:
         logger.exception("Error in chat endpoint")
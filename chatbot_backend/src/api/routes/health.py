@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from src.warmup import readiness
+
+router = APIRouter(prefix="/api/health", tags=["health"])
+
+
+@router.get("/live")
+async def liveness_api():
+    """The process is up and serving; independent of warm-up."""
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def readiness_api():
+    """
+    200 once the startup warm-up finished, 503 before, so no traffic reaches a cold worker;
+    the status is "degraded" while a dependency the warm-up needs is unreachable.
+    """
+    if not readiness["ready"]:
+        body = {"status": readiness["status"]}
+        if "error" in readiness["warmup"]:
+            body["error"] = readiness["warmup"]["error"]
+        return JSONResponse(body, status_code=503)
+    return {"status": "ready", "warmup": readiness["warmup"]}
@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+
+from src.api.routes import chat
+from src.llm.chatbot import response_cache
+from src.llm.checkpointer import get_checkpointer
+from src.llm.embedding import embedding_cache
+from src.llm.openai_client import _llm_extract_filters, filter_extraction_counters
+from src.order.order import order_cache
+
+router = APIRouter(prefix="/api", tags=["metrics"])
+
+
+@router.get("/metrics")
+async def metrics_api():
+    """Cache and runtime counters of this worker."""
+    order_stats = order_cache.stats()
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "filter_extraction": {
+            **filter_extraction_counters,
+            "llm_memo": _llm_extract_filters.cache_info()._asdict(),
+        },
+        "chat": {
+            **chat.chat_counters,
+            "active_turns": chat.active_turns,
+            "locked_sessions": len(chat.session_locks),
+        },
+        "response_cache": response_cache.stats(),
+        "sessions": await get_checkpointer().astats(),
+        "order_cache": order_stats,
+        # get_order_status is the only caller of list_orders_by_customer_id
+        "get_order_status": order_stats["endpoints"].get("customer_orders", {}),
+    }
@@ -13,15 +13,71 @@ class Settings(BaseSettings):
     # host
     host: str = "https://api.aailabbot.com"
     order_host: str = "https://api.order.aailabbot.com"
+    order_timeout: float = 10.0  # seconds per order service call
+    order_retries: int = 2  # retries on connection errors and 5xx
+    order_max_connections: int = 100
+    order_cache_size: int = 1024  # cached order service responses
 
     # openai config
     openai_api_key: str = ""
     openai_embedding_model: str = "text-embedding-3-small"
-    openai_embedding_size: int = 1536  # size of model "text-embedding-3-small"
+    # size of model "text-embedding-3-small"; text-embedding-3 models can return fewer dimensions
+    # (e.g. 256 or 512, see evaluate_embeddings.py). Changing it needs a new Pinecone index or a
+    # full re-embed of the local index.
+    openai_embedding_size: int = 1536
+    embedding_batch_max_tokens: int = 100_000  # tokens packed into one embeddings request
+    embedding_batch_max_size: int = 512  # inputs per embeddings request (API limit is 2048)
+    embedding_concurrency: int = 8  # embeddings requests in flight during ingestion
+    embedding_manifest_path: Path = project_dir / "data" / "embedding_manifest.json"
+    embedding_cache_path: Path = project_dir / "data" / "embedding_cache.sqlite3"
+    embedding_cache_size: int = 10_000  # entries kept in the in-memory tier
+
+    filter_extraction_timeout: float = 5.0  # seconds before searching without LLM-extracted filters
 
     # pinecone config
     pinecone_api_key: str = ""  # api key for pinecone
 
+    catalog_snapshot_path: Path = project_dir / "data" / "catalog.pkl"
+
+    # vector store backend: "pinecone" or "local" (in-process NumPy index)
+    vector_store: str = "pinecone"
+    local_index_dir: Path = project_dir / "data" / "index"
+    local_index_quantization: str = ""  # "int8": score int8 codes, re-rank the shortlist with float32
+    local_index_rerank_factor: int = 4  # shortlist size as a multiple of top_k
+
+    # hybrid search: BM25 over title/store/features/parent_asin fused with vector results
+    hybrid_search: bool = True
+    bm25_index_path: Path = project_dir / "data" / "bm25.pkl"
+    lexical_top_k: int = 20
+    search_top_k: int = 10  # products returned to the model per search
+
+    # semantic cache of whole answers for stateless first turns
+    response_cache_enabled: bool = True
+    response_cache_threshold: float = 0.95  # min cosine similarity to reuse an answer
+    response_cache_ttl: float = 3600  # seconds; also bounds staleness after a sync on another host
+    response_cache_size: int = 2000
+
+    # conversation store: "memory" (per worker) or "sqlite" (shared by the workers of a host)
+    checkpointer: str = "memory"
+    checkpoint_db_path: Path = project_dir / "data" / "checkpoints.sqlite3"
+    session_idle_ttl: float = 2 * 3600  # seconds without a turn before a session is dropped
+    max_sessions: int = 10_000
+    max_checkpoints_per_session: int = 4
+    session_max_messages: int = 40  # older turns are removed from the session
+
+    chat_max_concurrency: int = 64  # turns in flight per worker before /api/chat answers 429
+    idempotency_ttl: float = 300  # seconds an Idempotency-Key replays the answer of its turn
+
+    # prompt compaction: older turns are summarized, the rest must fit the token budget
+    compaction_keep_turns: int = 4
+    compaction_summary_batch: int = 4  # aged-out turns summarized per call
+    prompt_token_budget: int = 8000
+
+    # startup warm-up: the most frequent logged searches are embedded and searched before readiness
+    query_log_path: Path = project_dir / "data" / "query_log.jsonl"  # shared by all workers, rotate externally
+    warmup_queries: int = 200
+    warmup_concurrency: int = 8
+
     all_cors_origins: list[str] = []
 
     model_config = ConfigDict(
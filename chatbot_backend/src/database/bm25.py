@@ -0,0 +1,139 @@
+import logging
+import math
+import pickle
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from src.database.catalog import Catalog
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+INDEX_VERSION = 1
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase alphanumeric tokens. Words with inner punctuation also yield their joined form,
+    so "BY-M1" matches both "by m1" and "bym1".
+    """
+    text = text.lower()
+    tokens = TOKEN_RE.findall(text)
+    for word in text.split():
+        parts = TOKEN_RE.findall(word)
+        if len(parts) > 1:
+            tokens.append("".join(parts))
+    return tokens
+
+
+def product_text(product) -> str:
+    return " ".join([product.title, product.store, " ".join(product.features or []), product.parent_asin])
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over title, store, features and parent_asin of the catalogue.
+    Postings are NumPy arrays, so scoring a query is a few vectorised scatter-adds.
+    """
+
+    def __init__(self, postings: dict, doc_len: np.ndarray, catalog_version: str, k1: float = 1.2, b: float = 0.75):
+        self.postings: dict[str, tuple[np.ndarray, np.ndarray]] = postings
+        self.doc_len = doc_len
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+        self.catalog_version = catalog_version
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, catalog: Catalog) -> "BM25Index":
+        postings = defaultdict(lambda: ([], []))
+        doc_len = np.zeros(len(catalog), dtype=np.float32)
+        for idx, product in enumerate(catalog):
+            tokens = tokenize(product_text(product))
+            doc_len[idx] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                docs, tfs = postings[term]
+                docs.append(idx)
+                tfs.append(tf)
+        postings = {
+            term: (np.array(docs, dtype=np.int32), np.array(tfs, dtype=np.float32))
+            for term, (docs, tfs) in postings.items()
+        }
+        return cls(postings, doc_len, catalog.version)
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"version": INDEX_VERSION, "catalog_version": self.catalog_version, "postings": self.postings, "doc_len": self.doc_len},
+                f,
+                protocol=5,
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load_or_build(cls, catalog: Catalog, path: Path) -> "BM25Index":
+        """Load the persisted index if it was built from this catalogue, otherwise rebuild and persist it."""
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+            if data["version"] == INDEX_VERSION and data["catalog_version"] == catalog.version:
+                return cls(data["postings"], data["doc_len"], data["catalog_version"])
+            logger.info(f"BM25 index {path} is stale, rebuilding")
+        except FileNotFoundError:
+            logger.info(f"No BM25 index at {path}, building")
+        except Exception as e:
+            logger.warning(f"Could not read BM25 index {path}: {e}")
+
+        index = cls.build(catalog)
+        try:
+            index.save(path)
+        except OSError as e:
+            logger.warning(f"Could not write BM25 index {path}: {e}")
+        return index
+
+    def search(self, query: str, top_k: int = 10, mask: Optional[np.ndarray] = None) -> list[tuple[int, float]]:
+        """Return up to `top_k` (catalogue position, score) pairs; `mask` restricts the candidate rows."""
+        n_docs = len(self.doc_len)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        k = min(top_k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(idx), float(scores[idx])) for idx in top]
+
+
+def is_exact_match(query: str, product, hits: list[tuple[int, float]]) -> bool:
+    """
+    True when the top lexical hit names the queried product, e.g. "Ernie Ball Mondo Slinky":
+    every query token appears in its title/store/ASIN, the query looks like a product name
+    (several tokens or a model number) and the hit clearly beats the runner-up.
+    """
+    query_tokens = set(tokenize(query))
+    if not query_tokens or not hits:
+        return False
+    if len(query_tokens) < 2 and not any(ch.isdigit() for ch in query):
+        return False
+    product_tokens = set(tokenize(" ".join([product.title, product.store, product.parent_asin])))
+    if not query_tokens <= product_tokens:
+        return False
+    return len(hits) == 1 or hits[0][1] >= 1.2 * hits[1][1]
@@ -0,0 +1,300 @@
+import csv
+import hashlib
+import logging
+import os
+import pickle
+import sys
+from functools import cached_property
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from src.models.product import Product, safe_eval_dict, safe_eval_list
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 3
+SUMMARY_MAX_CHARS = 240  # length of the description excerpt returned to the model
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def summarize_description(description: str, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """Plain-text excerpt of a description, cut at a word boundary."""
+    if description and description.startswith("["):
+        parts = safe_eval_list(description)
+        if isinstance(parts, list):
+            description = " ".join(str(part) for part in parts)
+    text = " ".join((description or "").split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0].rstrip(",.;:") + "..."
+
+
+class ProductRecord:
+    """
+    Read-only view of one catalogue row with the same attributes as `Product`.
+    `features`, `categories` and `details` are decoded from their raw CSV text on access.
+    """
+
+    __slots__ = ("_catalog", "_idx")
+
+    def __init__(self, catalog: "Catalog", idx: int):
+        self._catalog = catalog
+        self._idx = idx
+
+    @property
+    def main_category(self) -> str:
+        return self._catalog.main_category[self._idx]
+
+    @property
+    def title(self) -> str:
+        return self._catalog.title[self._idx]
+
+    @property
+    def average_rating(self) -> Optional[float]:
+        value = self._catalog.average_rating[self._idx]
+        return None if np.isnan(value) else float(value)
+
+    @property
+    def rating_number(self) -> Optional[int]:
+        value = self._catalog.rating_number[self._idx]
+        return None if value < 0 else int(value)
+
+    @property
+    def features(self) -> Optional[List[str]]:
+        return safe_eval_list(self._catalog.features_raw[self._idx])
+
+    @property
+    def description(self) -> str:
+        return self._catalog.description[self._idx]
+
+    @property
+    def summary(self) -> str:
+        """Truncated description computed when the catalogue is built."""
+        return self._catalog.summary[self._idx]
+
+    @property
+    def price(self) -> float:
+        return float(self._catalog.price[self._idx])
+
+    @property
+    def store(self) -> str:
+        return self._catalog.store[self._idx]
+
+    @property
+    def categories(self) -> Optional[List[str]]:
+        return safe_eval_list(self._catalog.categories_raw[self._idx])
+
+    @property
+    def details(self) -> Optional[dict]:
+        return safe_eval_dict(self._catalog.details_raw[self._idx])
+
+    @property
+    def parent_asin(self) -> str:
+        return self._catalog.parent_asin[self._idx]
+
+    @property
+    def product_id(self) -> str:
+        """Stable id of the product in the vector index (its parent ASIN)."""
+        return self._catalog.parent_asin[self._idx]
+
+    def get_product_info(self) -> str:
+        return Product.get_product_info(self)
+
+    def search_result(self) -> dict:
+        """Compact, size-bounded view of the product returned by the search tools."""
+        return {
+            "product_id": self.product_id,
+            "title": self.title,
+            "price": self.price,
+            "rating": self.average_rating,
+            "review_count": self.rating_number,
+            "description": self.summary,
+        }
+
+    def metadata(self) -> dict:
+        """Metadata stored with the product's vector, used for filtering."""
+        return {
+            "product_id": self.product_id,
+            "price": self.price,
+            "average_rating": self.average_rating,
+            "rating_number": self.rating_number,
+        }
+
+    def to_product(self) -> Product:
+        return Product(**{field: getattr(self, field) for field in Product.model_fields})
+
+    def __repr__(self):
+        return f"ProductRecord({self._idx}, {self.title!r})"
+
+
+class Catalog:
+    """
+    Compact, list-like product catalogue.
+
+    Numeric fields live in NumPy arrays, repeated short strings are interned and the heavy
+    list/dict fields are kept as raw text until accessed. The catalogue is built from the CSV
+    once and then loaded from a pickle snapshot, which is invalidated when the CSV changes.
+    """
+
+    STRING_FIELDS = ("main_category", "title", "description", "summary", "store", "parent_asin")
+    RAW_FIELDS = ("features_raw", "categories_raw", "details_raw")
+
+    def __init__(self, columns: dict, source_digest: Optional[str] = None):
+        self.source_digest = source_digest  # sha256 of the CSV the columns were parsed from
+        self.price: np.ndarray = columns["price"]
+        self.average_rating: np.ndarray = columns["average_rating"]  # NaN when missing
+        self.rating_number: np.ndarray = columns["rating_number"]  # -1 when missing
+        for field in self.STRING_FIELDS + self.RAW_FIELDS:
+            setattr(self, field, columns[field])
+
+        # product id -> row position; the first row wins when a parent ASIN is repeated
+        self._index: dict[str, int] = {}
+        duplicates = 0
+        for idx, product_id in enumerate(self.parent_asin):
+            if not product_id:
+                continue
+            if product_id in self._index:
+                duplicates += 1
+                continue
+            self._index[product_id] = idx
+        if duplicates:
+            logger.warning(f"Catalog has {duplicates} rows with a duplicate parent_asin, only the first is indexed")
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def __getitem__(self, idx: int) -> ProductRecord:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("catalog index out of range")
+        return ProductRecord(self, idx)
+
+    def __iter__(self) -> Iterator[ProductRecord]:
+        for idx in range(len(self)):
+            yield ProductRecord(self, idx)
+
+    @cached_property
+    def version(self) -> str:
+        """
+        Content fingerprint; derived indexes and caches are rebuilt or dropped when it changes.
+        The hash of the source CSV (and the snapshot format), computed once when the snapshot
+        is built; only catalogues assembled from columns in memory hash their fields.
+        """
+        if self.source_digest:
+            return hashlib.sha256(f"{SNAPSHOT_VERSION}:{self.source_digest}".encode("utf-8")).hexdigest()[:16]
+        digest = hashlib.sha256()
+        for field in self.STRING_FIELDS + self.RAW_FIELDS:
+            digest.update("\x1f".join(value or "" for value in getattr(self, field)).encode("utf-8"))
+        for column in (self.price, self.average_rating, self.rating_number):
+            digest.update(column.tobytes())
+        return digest.hexdigest()[:16]
+
+    @cached_property
+    def filter_columns(self) -> dict[str, np.ndarray]:
+        """Filterable metadata as columns for `filter_mask`, missing values as NaN."""
+        return {
+            "price": self.price,
+            "average_rating": self.average_rating,
+            "rating_number": np.where(self.rating_number < 0, np.nan, self.rating_number.astype(np.float64)),
+        }
+
+    def get(self, product_id: str) -> Optional[ProductRecord]:
+        idx = self._index.get(str(product_id))
+        return None if idx is None else ProductRecord(self, idx)
+
+    def get_many(self, product_ids: List[str]) -> List[Optional[ProductRecord]]:
+        """Resolve ids in one pass, keeping their order; unknown ids map to None."""
+        index = self._index
+        return [
+            None if (idx := index.get(str(product_id))) is None else ProductRecord(self, idx)
+            for product_id in product_ids
+        ]
+
+    def indexed(self) -> Iterator[ProductRecord]:
+        """Products reachable by id, i.e. those that can be stored in the vector index."""
+        for idx in self._index.values():
+            yield ProductRecord(self, idx)
+
+    def positions(self) -> np.ndarray:
+        """Row positions of the products reachable by id, in row order."""
+        return np.array(sorted(self._index.values()), dtype=np.int64)
+
+    @classmethod
+    def from_csv(cls, file_path: str) -> "Catalog":
+        """Parse the CSV, skipping the same invalid rows as `Product.from_csv_row`."""
+        columns = {field: [] for field in ("price", "average_rating", "rating_number") + cls.STRING_FIELDS + cls.RAW_FIELDS}
+        with open(file_path, 'r') as file:
+            reader = csv.reader(file)
+            headers = next(reader)  # Get the header row
+            for row in reader:
+                try:
+                    product = Product.from_csv_row(row, headers)
+                except Exception as e:
+                    print(f"Error processing row: {row}")
+                    print(f"Error: {str(e)}")
+                    continue
+                data = dict(zip(headers, row))
+                columns["price"].append(product.price)
+                columns["average_rating"].append(np.nan if product.average_rating is None else product.average_rating)
+                columns["rating_number"].append(-1 if product.rating_number is None else product.rating_number)
+                columns["main_category"].append(sys.intern(product.main_category))
+                columns["store"].append(sys.intern(product.store))
+                columns["title"].append(product.title)
+                columns["description"].append(product.description)
+                columns["summary"].append(summarize_description(product.description))
+                columns["parent_asin"].append(product.parent_asin)
+                columns["features_raw"].append(data.get("features"))
+                columns["categories_raw"].append(sys.intern(data.get("categories") or ""))
+                columns["details_raw"].append(data.get("details"))
+
+        columns["price"] = np.array(columns["price"], dtype=np.float64)
+        columns["average_rating"] = np.array(columns["average_rating"], dtype=np.float64)
+        columns["rating_number"] = np.array(columns["rating_number"], dtype=np.int64)
+        return cls(columns, file_digest(file_path))
+
+    def save(self, path: Path, source_stat: tuple):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        columns = {field: getattr(self, field) for field in ("price", "average_rating", "rating_number") + self.STRING_FIELDS + self.RAW_FIELDS}
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"version": SNAPSHOT_VERSION, "source": source_stat, "source_digest": self.source_digest, "columns": columns},
+                f,
+                protocol=5,
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load_or_build(cls, csv_path: str, snapshot_path: Path) -> "Catalog":
+        """Load the snapshot if it was built from the current CSV, otherwise rebuild it from the CSV."""
+        stat = os.stat(csv_path)
+        source_stat = (stat.st_size, stat.st_mtime_ns)
+        try:
+            with open(snapshot_path, "rb") as f:
+                snapshot = pickle.load(f)
+            if snapshot["version"] == SNAPSHOT_VERSION and tuple(snapshot["source"]) == source_stat:
+                return cls(snapshot["columns"], snapshot["source_digest"])
+            logger.info(f"Catalog snapshot {snapshot_path} is stale, rebuilding")
+        except FileNotFoundError:
+            logger.info(f"No catalog snapshot at {snapshot_path}, building from {csv_path}")
+        except Exception as e:
+            logger.warning(f"Could not read catalog snapshot {snapshot_path}: {e}")
+
+        catalog = cls.from_csv(csv_path)
+        try:
+            catalog.save(snapshot_path, source_stat)
+        except OSError as e:
+            logger.warning(f"Could not write catalog snapshot {snapshot_path}: {e}")
+        return catalog
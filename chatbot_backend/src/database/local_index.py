@@ -0,0 +1,351 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SCORE_CHUNK = 65536  # rows of int8 codes widened to float32 at a time while scoring
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization: vectors[i] ~= codes[i] * scales[i]."""
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    scales = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), SCORE_CHUNK):
+        chunk = np.asarray(vectors[start : start + SCORE_CHUNK], dtype=np.float32)
+        scale = np.abs(chunk).max(axis=1) / 127
+        scale[scale == 0] = 1.0
+        codes[start : start + SCORE_CHUNK] = np.rint(chunk / scale[:, None])
+        scales[start : start + SCORE_CHUNK] = scale
+    return codes, scales
+
+
+def int8_scores(codes: np.ndarray, scales: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """Approximate (rows, queries) inner products from int8 codes, widening one chunk at a time."""
+    scores = np.empty((len(codes), len(queries)), dtype=np.float32)
+    for start in range(0, len(codes), SCORE_CHUNK):
+        chunk = codes[start : start + SCORE_CHUNK].astype(np.float32)
+        scores[start : start + SCORE_CHUNK] = chunk @ queries.T
+    return scores * scales[:, None]
+
+
+def _column_mask(column: np.ndarray, op: str, value) -> np.ndarray:
+    if op == "$eq":
+        return column == value
+    if op == "$ne":
+        return column != value
+    if op == "$gt":
+        return column > value
+    if op == "$gte":
+        return column >= value
+    if op == "$lt":
+        return column < value
+    if op == "$lte":
+        return column <= value
+    if op == "$in":
+        return np.isin(column, value)
+    if op == "$nin":
+        return ~np.isin(column, value)
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def filter_mask(columns: dict[str, np.ndarray], pinecone_filter: dict, size: int) -> np.ndarray:
+    """
+    Evaluate a Pinecone-style filter (as produced by `build_filter`) as a boolean mask over columnar metadata.
+
+    Missing values are stored as NaN (numeric) or "" (string), so range and equality
+    operators never match them, the same way Pinecone skips records without the field.
+    """
+    mask = np.ones(size, dtype=bool)
+    for key, condition in (pinecone_filter or {}).items():
+        column = columns.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if column is None:
+                # records without the field only satisfy negative operators
+                if op not in {"$ne", "$nin"}:
+                    mask[:] = False
+                continue
+            mask &= _column_mask(column, op, value)
+    return mask
+
+
+def _to_column(values: list) -> np.ndarray:
+    """Pack one metadata field into a float64 (NaN for missing) or string column."""
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return np.array(["" if v is None else str(v) for v in values], dtype=str)
+
+
+def _is_int_column(values: list) -> bool:
+    """Integer fields (e.g. rating_number) share the float64 column type but are returned as ints."""
+    present = [v for v in values if v is not None]
+    return bool(present) and all(isinstance(v, int) and not isinstance(v, bool) for v in present)
+
+
+def _from_column(value, integer: bool = False):
+    if isinstance(value, np.floating):
+        if np.isnan(value):
+            return None
+        return int(value) if integer else float(value)
+    if isinstance(value, np.str_):
+        return str(value)
+    return value.item() if hasattr(value, "item") else value
+
+
+class LocalNamespace:
+    """
+    Vectors and columnar metadata of one namespace, backed by `<name>.vectors.npy` / `<name>.meta.npz`.
+
+    With `quantization="int8"` candidates are scored from int8 codes held in memory
+    (`<name>.int8.npz`), and the best `rerank_factor * top_k` are re-ranked with the float32
+    vectors, of which only those rows are read from the memory map.
+    """
+
+    def __init__(self, directory: Path, name: str, dimension: int, quantization: str = "", rerank_factor: int = 4):
+        self.vectors_path = directory / f"{name}.vectors.npy"
+        self.meta_path = directory / f"{name}.meta.npz"
+        self.codes_path = directory / f"{name}.int8.npz"
+        self.dimension = dimension
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.ids = np.array([], dtype=str)
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.codes: np.ndarray | None = None
+        self.scales: np.ndarray | None = None
+        self.columns: dict[str, np.ndarray] = {}
+        self.int_columns: set[str] = set()
+        self._pending: dict[str, tuple[np.ndarray, dict]] = {}
+        if self.vectors_path.exists() and self.meta_path.exists():
+            self.load()
+
+    def load(self):
+        # memory-mapped read-only: workers share the page cache instead of holding a copy each
+        vectors = np.load(self.vectors_path, mmap_mode="r")
+        if vectors.shape[1] != self.dimension:
+            logger.warning(
+                f"Local index {self.vectors_path} has {vectors.shape[1]} dimensions, expected {self.dimension}; "
+                "starting empty, re-run embed_products.py --full"
+            )
+            return
+        self.vectors = vectors
+        with np.load(self.meta_path) as meta:
+            self.ids = meta["ids"]
+            self.columns = {k[len("meta_"):]: meta[k] for k in meta.files if k.startswith("meta_")}
+            if "int_columns" in meta.files:
+                self.int_columns = set(meta["int_columns"].tolist())
+            else:
+                # written before integer fields were recorded: whole-number numeric columns
+                self.int_columns = {
+                    key
+                    for key, column in self.columns.items()
+                    if column.dtype.kind == "f" and np.all(np.isnan(column) | (column == np.round(column)))
+                }
+        if self.quantization == "int8" and self.codes_path.exists():
+            with np.load(self.codes_path) as codes:
+                if len(codes["scales"]) == len(self.ids):
+                    self.codes, self.scales = codes["codes"], codes["scales"]
+        self._quantize(rebuild=False)
+        logger.info(f"Loaded local index {self.vectors_path} with {len(self.ids)} vectors")
+
+    def _quantize(self, rebuild: bool = True):
+        if self.quantization != "int8":
+            return
+        if rebuild or self.codes is None:
+            self.codes, self.scales = quantize_int8(self.vectors)
+
+    def __len__(self):
+        self._flush()
+        return len(self.ids)
+
+    def metadata(self, idx: int) -> dict:
+        return {key: _from_column(column[idx], key in self.int_columns) for key, column in self.columns.items()}
+
+    def upsert(self, vectors: list[dict]):
+        for record in vectors:
+            vector = np.asarray(record["values"], dtype=np.float32)
+            self._pending[str(record["id"])] = (vector, record.get("metadata") or {})
+
+    def update(self, id: str, set_metadata: dict):
+        """Merge `set_metadata` into the metadata of an existing vector."""
+        id = str(id)
+        if id in self._pending:
+            vector, meta = self._pending[id]
+        else:
+            rows = np.flatnonzero(self.ids == id)
+            if not len(rows):
+                return
+            vector, meta = np.array(self.vectors[rows[0]]), self.metadata(rows[0])
+        self._pending[id] = (vector, {**meta, **set_metadata})
+
+    def delete(self, ids: list[str]):
+        self._flush()
+        keep = ~np.isin(self.ids, [str(i) for i in ids])
+        self.ids = self.ids[keep]
+        self.vectors = np.ascontiguousarray(self.vectors[keep])
+        self.columns = {key: column[keep] for key, column in self.columns.items()}
+        if self.codes is not None:
+            self.codes, self.scales = self.codes[keep], self.scales[keep]
+
+    def _flush(self):
+        """Merge pending upserts into the contiguous arrays (copy-on-write of the memory map)."""
+        if not self._pending:
+            return
+        rows = {str(id_): i for i, id_ in enumerate(self.ids)}
+        keys = set(self.columns) | {k for _, meta in self._pending.values() for k in meta}
+        ids = [str(i) for i in self.ids]
+        metadata = [self.metadata(i) for i in range(len(ids))]
+        vectors = np.array(self.vectors, dtype=np.float32)
+        new_vectors = []
+        for id_, (vector, meta) in self._pending.items():
+            if id_ in rows:
+                vectors[rows[id_]] = vector
+                metadata[rows[id_]] = meta
+            else:
+                ids.append(id_)
+                metadata.append(meta)
+                new_vectors.append(vector)
+        if new_vectors:
+            vectors = np.vstack([vectors, np.stack(new_vectors)])
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.vectors = np.ascontiguousarray(vectors / norms, dtype=np.float32)
+        self.ids = np.array(ids, dtype=str)
+        values = {key: [meta.get(key) for meta in metadata] for key in keys}
+        self.columns = {key: _to_column(column) for key, column in values.items()}
+        self.int_columns = {key for key, column in values.items() if _is_int_column(column)}
+        self._pending = {}
+        self._quantize()
+
+    def save(self):
+        self._flush()
+        self.vectors_path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(self.vectors_path, self.vectors)
+        np.savez(
+            self.meta_path,
+            ids=self.ids,
+            int_columns=np.array(sorted(self.int_columns), dtype=str),
+            **{f"meta_{k}": v for k, v in self.columns.items()},
+        )
+        if self.codes is not None:
+            np.savez(self.codes_path, codes=self.codes, scales=self.scales)
+        logger.info(f"Saved local index {self.vectors_path} with {len(self.ids)} vectors")
+
+    def _matches(self, idx: np.ndarray, scores: np.ndarray, include_values: bool, include_metadata: bool) -> list[dict]:
+        matches = []
+        for i, score in zip(idx, scores):
+            match = {"id": str(self.ids[i]), "score": float(score)}
+            if include_metadata:
+                match["metadata"] = self.metadata(i)
+            if include_values:
+                match["values"] = self.vectors[i].tolist()
+            matches.append(match)
+        return matches
+
+    def query(self, vector, filter: dict, top_k: int, include_values: bool, include_metadata: bool) -> list[dict]:
+        return self.query_many([vector], [filter], top_k, include_values, include_metadata)[0]
+
+    def query_many(
+        self, vectors, filters: list[dict], top_k: int, include_values: bool, include_metadata: bool
+    ) -> list[list[dict]]:
+        """Score all queries with one matrix product; `filters` holds one filter per query."""
+        self._flush()
+        if not len(self.ids) or not len(vectors):
+            return [[] for _ in vectors]
+        queries = np.array(vectors, dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True).clip(min=1e-12)
+        if self.codes is not None:
+            scores = int8_scores(self.codes, self.scales, queries)
+            k_candidates = top_k * self.rerank_factor
+        else:
+            scores = self.vectors @ queries.T  # (products, queries)
+            k_candidates = top_k
+
+        results = []
+        for col, filter in enumerate(filters):
+            column = scores[:, col]
+            candidates = np.flatnonzero(filter_mask(self.columns, filter, len(self.ids))) if filter else None
+            if candidates is not None:
+                if not len(candidates):
+                    results.append([])
+                    continue
+                column = column[candidates]
+            k = min(k_candidates, len(column))
+            top = np.argpartition(-column, k - 1)[:k]
+            idx = top if candidates is None else candidates[top]
+            top_scores = column[top]
+            if self.codes is not None:
+                # re-rank the shortlist with full precision; sorted rows keep the memory-map reads sequential
+                idx = np.sort(idx)
+                top_scores = self.vectors[idx] @ queries[col]
+            order = np.argsort(-top_scores)[:top_k]
+            results.append(self._matches(idx[order], top_scores[order], include_values, include_metadata))
+        return results
+
+
+class LocalVectorIndex:
+    """
+    In-process vector index exposing the subset of the Pinecone `Index` API used by `PineconeClient`.
+
+    Embeddings are kept L2-normalised in a contiguous float32 matrix, so cosine top-k is a
+    single matrix-vector product followed by `argpartition`.
+    """
+
+    def __init__(self, directory: Path, dimension: int, quantization: str = "", rerank_factor: int = 4):
+        self.directory = Path(directory)
+        self.dimension = dimension
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.namespaces: dict[str, LocalNamespace] = {}
+
+    def namespace(self, name: str) -> LocalNamespace:
+        if name not in self.namespaces:
+            self.namespaces[name] = LocalNamespace(
+                self.directory, name or "default", self.dimension, self.quantization, self.rerank_factor
+            )
+        return self.namespaces[name]
+
+    def upsert(self, vectors: list[dict], namespace: str = ""):
+        self.namespace(namespace).upsert(vectors)
+
+    def update(self, id: str, set_metadata: dict, namespace: str = ""):
+        self.namespace(namespace).update(id, set_metadata)
+
+    def delete(self, ids: list[str], namespace: str = ""):
+        self.namespace(namespace).delete(ids)
+
+    def query(
+        self,
+        vector,
+        namespace: str = "",
+        filter: dict = None,
+        top_k: int = 10,
+        include_values: bool = False,
+        include_metadata: bool = True,
+    ) -> dict:
+        matches = self.namespace(namespace).query(
+            vector, filter or {}, top_k, include_values, include_metadata
+        )
+        return {"matches": matches, "namespace": namespace}
+
+    def query_many(
+        self,
+        vectors,
+        namespace: str = "",
+        filters: list[dict] = None,
+        top_k: int = 10,
+        include_values: bool = False,
+        include_metadata: bool = True,
+    ) -> list[dict]:
+        """Batched `query`: one result per vector, all scored with a single matrix product."""
+        filters = filters or [{}] * len(vectors)
+        results = self.namespace(namespace).query_many(vectors, filters, top_k, include_values, include_metadata)
+        return [{"matches": matches, "namespace": namespace} for matches in results]
+
+    def save(self):
+        for ns in self.namespaces.values():
+            ns.save()
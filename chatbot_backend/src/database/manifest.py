@@ -0,0 +1,73 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from src.database.catalog import ProductRecord
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(product: ProductRecord) -> str:
+    """
+    Hash of the text that gets embedded.
+    The price line is left out: prices are served from vector metadata, so a price-only
+    change is sent as a metadata update instead of a re-embed.
+    """
+    info = "\n".join(
+        line for line in product.get_product_info().splitlines() if not line.startswith("Price: ")
+    )
+    return hashlib.sha256(info.encode("utf-8")).hexdigest()
+
+
+def metadata_hash(metadata: dict) -> str:
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class EmbeddingManifest:
+    """
+    Persistent map of product id -> {"text": text hash, "meta": metadata hash} for the vectors in the index.
+    Used by `embed_products.py` to only embed new/changed products and delete removed ones.
+    `embedding` records the model and size the vectors were made with.
+    """
+
+    def __init__(self, path: Path, embedding: str):
+        self.path = Path(path)
+        self.entries: dict[str, dict] = {}
+        self.embedding = embedding
+        self.embedding_changed = False
+        if self.path.exists():
+            with open(self.path) as f:
+                data = json.load(f)
+            if "products" in data:
+                self.entries = data["products"]
+                self.embedding_changed = data.get("embedding") != embedding
+            else:
+                # manifests written before the embedding was recorded
+                self.entries = data
+            logger.info(f"Loaded embedding manifest {self.path} with {len(self.entries)} products")
+
+    def diff(self, product_id: str, text: str, meta: str) -> str:
+        """Return "new", "text", "meta" or "unchanged" for a product against the manifest."""
+        entry = self.entries.get(product_id)
+        if entry is None:
+            return "new"
+        if entry["text"] != text:
+            return "text"
+        if entry["meta"] != meta:
+            return "meta"
+        return "unchanged"
+
+    def set(self, product_id: str, text: str, meta: str):
+        self.entries[product_id] = {"text": text, "meta": meta}
+
+    def remove(self, product_ids: list[str]):
+        for product_id in product_ids:
+            self.entries.pop(product_id, None)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"embedding": self.embedding, "products": self.entries}, f)
+        tmp_path.replace(self.path)
@@ -1,7 +1,9 @@
+import asyncio
 import logging
 import re
 import time
 import json
+from functools import lru_cache
 from async_lru import alru_cache
 from funcy import log_durations
 from langchain_core.documents import Document
@@ -10,7 +12,10 @@ from pinecone.grpc import PineconeGRPC as Pinecone
 from retry import retry
 
 from src.config import s
-from src.llm.embedding import embed_text
+from src.database.bm25 import BM25Index, is_exact_match
+from src.database.local_index import LocalVectorIndex, filter_mask
+from src.database.products import products
+from src.llm.embedding import embed_queries, embed_text
 
 
 logging.basicConfig(format="%(levelname)s %(name)s  %(message)s", level=logging.INFO)
@@ -56,14 +61,57 @@ def build_filter(filters: dict) -> dict:
     return pinecone_filter
 
 
+def reciprocal_rank_fusion(rankings: list[list[Document]], top_k: int, k: int = 60) -> list[Document]:
+    """Merge ranked document lists by summing 1 / (k + rank) per document id."""
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc.id, doc)
+    return [docs[doc_id] for doc_id in sorted(scores, key=scores.get, reverse=True)[:top_k]]
+
+
+# filters dropped first when a query has no matches; unknown keys go before these
+RELAXATION_ORDER = ["rating_number", "average_rating", "price"]
+
+
+def relaxation_tiers(filters: dict) -> list[tuple[dict, list[str]]]:
+    """
+    Progressively relaxed versions of `filters`, strictest first, ending with no filters.
+    Each tier is (filters, names of the filters dropped from the original).
+    """
+    order = sorted(filters, key=lambda key: RELAXATION_ORDER.index(key) if key in RELAXATION_ORDER else -1)
+    tiers = []
+    for dropped in range(len(order) + 1):
+        relaxed = order[:dropped]
+        tier = {key: value for key, value in filters.items() if key not in relaxed}
+        if not tiers or build_filter(tier) != build_filter(tiers[-1][0]):
+            tiers.append((tier, relaxed))
+    return tiers
+
+
 class PineconeClient:
-    def __init__(self, api_key: str):
-        self.pinecone = Pinecone(api_key=api_key)
-        self.index = self.pinecone.Index("music-instruments")
+    def __init__(self, api_key: str, vector_store: str = "pinecone", lexical_index: BM25Index = None):
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        if vector_store == "local":
+            # drop-in replacement for the Pinecone index, searched in-process
+            self.pinecone = None
+            self.index = LocalVectorIndex(
+                s.local_index_dir,
+                s.openai_embedding_size,
+                quantization=s.local_index_quantization,
+                rerank_factor=s.local_index_rerank_factor,
+            )
+        else:
+            self.pinecone = Pinecone(api_key=api_key)
+            self.index = self.pinecone.Index("music-instruments")
 
 
     def create_index(self, index_name: str):
         """Create index if it doesn't exist."""
+        if self.pinecone is None:
+            return
         if not self.pinecone.has_index(index_name):
             self.pinecone.create_index(
                 name=index_name,
@@ -93,52 +141,176 @@ class PineconeClient:
                 records = []
         if records:
             self.index.upsert(vectors=records, namespace=namespace)
-            
+
+    def update_metadata(self, products: list[dict], namespace: str):
+        """Update only the metadata of existing vectors, e.g. after a price or rating change."""
+        for product in products:
+            self.index.update(
+                id=str(product["id"]), set_metadata=product["metadata"], namespace=namespace
+            )
+
+    def delete_products(self, ids: list[str], namespace: str):
+        batch_size = 1000  # Pinecone limit of ids per delete request
+        for i in range(0, len(ids), batch_size):
+            self.index.delete(ids=[str(id_) for id_ in ids[i:i + batch_size]], namespace=namespace)
+
+    def persist(self):
+        """Write the local index to disk; Pinecone persists upserts server-side."""
+        if isinstance(self.index, LocalVectorIndex):
+            self.index.save()
+
+    def warmup(self, namespace: str) -> int:
+        """Open the gRPC channel (or load the local index) before the first query; returns the vector count."""
+        if isinstance(self.index, LocalVectorIndex):
+            return len(self.index.namespace(namespace))
+        stats = self.index.describe_index_stats()
+        summary = stats.namespaces.get(namespace)
+        return summary.vector_count if summary else 0
+
     @retry(tries=3, delay=1)
-    async def _pinecone_query(self, query: str, filters: dict, namespace: str):
+    def _query_index(self, vector: list[float], pinecone_filter: dict, namespace: str):
+        return self.index.query(
+            namespace=namespace,
+            vector=vector,
+            filter=pinecone_filter,
+            top_k=s.search_top_k,
+            include_values=False,
+            include_metadata=True,
+        )
+
+    async def _pinecone_query(
+        self, query: str, filters: dict, namespace: str, prefetched: list[dict] = None
+    ) -> tuple[list[dict], list[str]]:
+        """
+        Query with the filters and all relaxed tiers concurrently and return the matches of the
+        strictest tier that has any, with the names of the filters that had to be dropped.
+        The query is embedded once; only the index calls are retried. `prefetched` holds the
+        matches of the unrelaxed query when `search_many` already ran it.
+        """
+        if prefetched:
+            return prefetched, []
         embedded_vector = await embed_text(query)
 
-        pinecone_filter = build_filter(filters)
-        logger.info(f"Pinecone build_filter {filters} to {pinecone_filter}")
-        try:
-            results = self.index.query(
-                namespace=namespace,
-                vector=embedded_vector,
-                filter=pinecone_filter,
-                top_k=10,
-                include_values=False,
-                include_metadata=True,
+        tiers = relaxation_tiers(filters)
+        if prefetched is not None:
+            tiers = tiers[1:]
+        tasks = [
+            asyncio.create_task(
+                asyncio.to_thread(self._query_index, embedded_vector, build_filter(tier), namespace)
             )
-        except Exception as e:
-            logger.error(f"Error querying Pinecone: {e}")
+            for tier, _ in tiers
+        ]
+        logger.info(f"Pinecone build_filter {filters} to {build_filter(filters)}, {len(tiers)} tiers")
+        error = None
+        try:
+            for task, (_, relaxed) in zip(tasks, tiers):
+                try:
+                    results = await task
+                except Exception as e:
+                    logger.error(f"Error querying Pinecone: {e}")
+                    error = e
+                    continue
+                if results and results["matches"]:
+                    if relaxed:
+                        logger.info(f"_pinecone_query relaxed filters {relaxed}")
+                    return results["matches"], relaxed
+        finally:
+            for task in tasks:
+                task.cancel()
+        if error is not None:
+            raise error
+        return [], []
 
-        if not results or not results["matches"]:  # query without filters
-            logger.debug(f"_pinecone_query Pinecone query without filters")
-            results = self.index.query(
-                namespace=namespace,
-                vector=embedded_vector,
-                filter={},
-                top_k=10,
-                include_values=False,
-                include_metadata=True,
-            )
-        return results
+    def _lexical_search(self, query: str, filters: dict) -> tuple[list[Document], bool]:
+        """
+        BM25 search over the catalogue with the same filter semantics as the vector query.
+        Also returns whether the top hit is an exact match for a product name.
+        """
+        docs, exact = self._lexical_hits(query, json.dumps(filters or {}, sort_keys=True))
+        return list(docs), exact
+
+    @lru_cache(maxsize=1024)
+    def _lexical_hits(self, query: str, filters: str) -> tuple[tuple[Document, ...], bool]:
+        """Memoized per (query, filters), so `has_exact_match` followed by `search` scores the query once."""
+        pinecone_filter = build_filter(json.loads(filters))
+        mask = filter_mask(products.filter_columns, pinecone_filter, len(products)) if pinecone_filter else None
+        hits = self.lexical_index.search(query, top_k=s.lexical_top_k, mask=mask)
+        if not hits:
+            return (), False
+        docs = tuple(
+            Document(id=products[idx].product_id, metadata=products[idx].metadata(), page_content="")
+            for idx, _ in hits
+        )
+        return docs, is_exact_match(query, products[hits[0][0]], hits)
 
     @log_durations(logging.info)
     @alru_cache(maxsize=1000)
-    async def search(self, query: str, namespace: str, filters: str):
+    async def search(self, query: str, namespace: str, filters: str) -> tuple[list[Document], list[str]]:
+        """Return the matching documents and the names of the filters relaxed to find any."""
         if not query:
-            return []
+            return [], []
+        return await self._search(query, namespace, json.loads(filters) if filters else {})
 
-        if not filters:
-            filters = {}
-        else:
-            filters = json.loads(filters)
+    @log_durations(logging.info)
+    async def search_many(
+        self, queries: list[str], namespace: str, filters: list[str]
+    ) -> list[tuple[list[Document], list[str]]]:
+        """
+        `search` for several queries at once, with one result per query.
+
+        Queries without an exact product name match are embedded in a single request. The index
+        queries then run concurrently, or as one matrix product against the local index.
+        """
+        parsed = [json.loads(f) if f else {} for f in filters]
+        searched = [i for i, query in enumerate(queries) if query]
+        lexical = {i: self._lexical_search(queries[i], parsed[i]) for i in searched} if self.lexical_index else {}
+        # exact product name matches are answered lexically and never embedded
+        embedded = [i for i in searched if not (i in lexical and lexical[i][1])]
+        vectors = await embed_queries([queries[i] for i in embedded]) if embedded else []
+
+        prefetched = {}
+        if isinstance(self.index, LocalVectorIndex) and embedded:
+            results = await asyncio.to_thread(
+                self.index.query_many,
+                vectors,
+                namespace=namespace,
+                filters=[build_filter(parsed[i]) for i in embedded],
+                top_k=s.search_top_k,
+            )
+            prefetched = {i: result["matches"] for i, result in zip(embedded, results)}
+
+        results = await asyncio.gather(
+            *(self._search(queries[i], namespace, parsed[i], prefetched.get(i), lexical.get(i)) for i in searched)
+        )
+        by_position = dict(zip(searched, results))
+        return [by_position.get(i, ([], [])) for i in range(len(queries))]
+
+    def has_exact_match(self, query: str) -> bool:
+        """
+        Whether `query` names a product outright, in which case `search` needs no embedding.
+        The lexical hits are memoized, so a following unfiltered `search` does not score them again.
+        """
+        return bool(self.lexical_index) and self._lexical_search(query, {})[1]
+
+    async def _search(
+        self,
+        query: str,
+        namespace: str,
+        filters: dict,
+        prefetched: list[dict] = None,
+        lexical: tuple[list[Document], bool] = None,
+    ) -> tuple[list[Document], list[str]]:
+        if lexical is None:
+            lexical = self._lexical_search(query, filters) if self.lexical_index else ([], False)
+        lexical_docs, exact_match = lexical
+        if exact_match:
+            logger.info(f"Exact lexical match for {query}, skipping embedding and vector query")
+            return lexical_docs[: s.search_top_k], []
 
         logger.info(f"Pinecone search {query} {filters} {namespace}")
-        results = await self._pinecone_query(query, filters, namespace)
+        matches, relaxed = await self._pinecone_query(query, filters, namespace, prefetched)
         docs = []
-        for match in results["matches"]:
+        for match in matches:
             docs.append(
                 Document(
                     id=match["id"],
@@ -146,8 +318,18 @@ class PineconeClient:
                     page_content="",
                 )
             )
-        return docs
+        if relaxed and self.lexical_index:
+            # no product satisfied every filter, rank lexically under the same relaxed filters
+            relaxed_filters = {key: value for key, value in filters.items() if key not in relaxed}
+            lexical_docs, _ = self._lexical_search(query, relaxed_filters)
+        if lexical_docs:
+            docs = reciprocal_rank_fusion([docs, lexical_docs], top_k=s.search_top_k)
+        return docs, relaxed
 
 
 # Create the client instance
-pineconeClient = PineconeClient(api_key=s.pinecone_api_key)
+pineconeClient = PineconeClient(
+    api_key=s.pinecone_api_key,
+    vector_store=s.vector_store,
+    lexical_index=BM25Index.load_or_build(products, s.bm25_index_path) if s.hybrid_search else None,
+)
@@ -0,0 +1,176 @@
+import logging
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from src.database.catalog import Catalog
+from src.database.products import products
+from src.models.product import safe_eval_list
+
+logger = logging.getLogger(__name__)
+
+# metric -> whether the best products have the highest values (the cheapest are the best by price)
+RANK_METRICS = {"average_rating": True, "rating_number": True, "price": False}
+WORD_RE = re.compile(r"[a-z0-9]+")
+FILLER_WORDS = {"product", "item", "gear", "stuff", "all"}
+SAME_PLURAL = {"series", "species"}  # "-ies" words that are their own singular
+
+
+def singular(word: str) -> str:
+    if word in SAME_PLURAL:
+        return word
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def category_tokens(name: str) -> frozenset[str]:
+    """Lowercase singular words, so "guitar" matches "Guitars" and "accessory" "Accessories"."""
+    return frozenset(singular(word) for word in WORD_RE.findall(name.lower()))
+
+
+class RankedRows:
+    """
+    Products of one category in every ranking order.
+
+    `by_price` / `prices` are sorted by price with unknown prices (0) last as +inf, so a
+    price range is a `searchsorted` slice; `by_metric[m]` lists the products with a value for
+    `m` from best to worst.
+    """
+
+    def __init__(self, rows: np.ndarray, ranks: dict[str, np.ndarray], price: np.ndarray):
+        self.by_price = rows[np.argsort(ranks["price"][rows], kind="stable")]
+        self.prices = np.where(price[self.by_price] > 0, price[self.by_price], np.inf)
+        self.by_metric = {}
+        for metric, rank in ranks.items():
+            ordered = rows[np.argsort(rank[rows], kind="stable")]
+            self.by_metric[metric] = ordered[rank[ordered] < len(rank)]
+
+    def __len__(self):
+        return len(self.by_price)
+
+
+class CatalogRankings:
+    """
+    Exact "top k by metric within a price range" listings per category, built once from the catalogue.
+
+    Every product gets a global rank per metric (ties broken by the other rating metric), so
+    ranking any subset is a sort or partial sort of integers and needs no embedding or vector query.
+    """
+
+    def __init__(self, catalog: Catalog):
+        self.catalog = catalog
+        positions = catalog.positions()
+        n = len(catalog)
+        avg = np.nan_to_num(catalog.average_rating, nan=-1.0)
+        count = catalog.rating_number.astype(np.float64)
+        valid = {
+            "average_rating": ~np.isnan(catalog.average_rating),
+            "rating_number": catalog.rating_number >= 0,
+            "price": catalog.price > 0,
+        }
+        # np.lexsort sorts by the last key first
+        orders = {
+            "average_rating": np.lexsort((-count, -avg)),
+            "rating_number": np.lexsort((-avg, -count)),
+            "price": np.lexsort((-avg, catalog.price)),
+        }
+        self.ranks: dict[str, np.ndarray] = {}
+        for metric, order in orders.items():
+            rank = np.empty(n, dtype=np.int64)
+            rank[order] = np.arange(n)
+            rank[~valid[metric]] = n  # no value: sorts last and is left out of the metric's listing
+            self.ranks[metric] = rank
+
+        members = defaultdict(list)
+        parsed = {}
+        for idx in positions:
+            raw = catalog.categories_raw[idx]
+            if raw not in parsed:
+                parsed[raw] = [name for name in (safe_eval_list(raw) or []) if isinstance(name, str)]
+            for name in set(parsed[raw] + [catalog.main_category[idx]]):
+                if name:
+                    members[name].append(idx)
+
+        self.all = RankedRows(positions, self.ranks, catalog.price)
+        self.categories = {
+            name: RankedRows(np.array(rows, dtype=np.int64), self.ranks, catalog.price)
+            for name, rows in members.items()
+        }
+        self._tokens = {name: category_tokens(name) for name in self.categories}
+        logger.info(f"Built rankings for {len(self.categories)} categories over {len(positions)} products")
+
+    def match_categories(self, category: str) -> list[str]:
+        """
+        Categories named exactly by the words of `category` ("guitar" is "Guitars"), or when
+        there is none, every category whose name contains all of them ("Electric Guitars", ...).
+        """
+        wanted = category_tokens(category) - FILLER_WORDS
+        if not wanted:
+            return []
+        exact = sorted(name for name, tokens in self._tokens.items() if tokens - FILLER_WORDS == wanted)
+        if exact:
+            return exact
+        return sorted(name for name, tokens in self._tokens.items() if wanted <= tokens)
+
+    @lru_cache(maxsize=256)
+    def _rows(self, category: str) -> tuple[Optional[RankedRows], tuple[str, ...]]:
+        if not category or not category_tokens(category) - FILLER_WORDS:
+            return self.all, ()
+        names = self.match_categories(category)
+        if not names:
+            return None, ()
+        if len(names) == 1:
+            return self.categories[names[0]], tuple(names)
+        rows = np.unique(np.concatenate([self.categories[name].by_price for name in names]))
+        return RankedRows(rows, self.ranks, self.catalog.price), tuple(names)
+
+    def top(
+        self,
+        category: str = "",
+        sort_by: str = "average_rating",
+        top_k: int = 5,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        best_first: bool = True,
+    ) -> tuple[Optional[list[int]], tuple[str, ...]]:
+        """
+        Catalogue positions of the `top_k` products of `category` ranked by `sort_by`, and the
+        categories that matched. `best_first=False` reverses the ranking (e.g. most expensive).
+        Positions are None when no category matches; an empty or filler-only `category`
+        ("products", "all") ranks the whole store and matches no named category.
+        """
+        if sort_by not in RANK_METRICS:
+            raise ValueError(f"sort_by must be one of {', '.join(RANK_METRICS)}")
+        ranked, names = self._rows(category.strip().lower())
+        if ranked is None:
+            return None, names
+        if top_k <= 0:
+            return [], names
+        rank = self.ranks[sort_by]
+
+        if min_price is None and max_price is None:
+            ordered = ranked.by_metric[sort_by]
+            top = ordered[:top_k] if best_first else ordered[::-1][:top_k]
+            return top.tolist(), names
+
+        lo = np.searchsorted(ranked.prices, min_price if min_price is not None else -np.inf, side="left")
+        # unknown prices (+inf) are outside any range
+        hi = np.searchsorted(ranked.prices, max_price if max_price is not None else np.inf, side="right" if max_price is not None else "left")
+        rows = ranked.by_price[lo:hi]
+        rows = rows[rank[rows] < len(rank)]
+        if not len(rows):
+            return [], names
+        keys = rank[rows] if best_first else -rank[rows]
+        k = min(top_k, len(rows))
+        top = np.argpartition(keys, k - 1)[:k]
+        top = top[np.argsort(keys[top], kind="stable")]
+        return rows[top].tolist(), names
+
+
+rankings = CatalogRankings(products)
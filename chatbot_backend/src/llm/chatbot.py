@@ -1,14 +1,15 @@
 import ast
+import asyncio
 import os
 import re
 import json
 import csv
-from typing import Annotated
+from contextvars import ContextVar
+from typing import Annotated, Optional
 import logging
 
-from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
 from langchain_core.tools import tool
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph.graph import CompiledGraph
 from langgraph.prebuilt import InjectedState, ToolNode, create_react_agent
 from langgraph.prebuilt.chat_agent_executor import AgentState
@@ -16,8 +17,14 @@ from langchain_openai import ChatOpenAI
 
 from src.config import s
 from src.database.pinecone_client import pineconeClient
-from src.llm.openai_client import extract_filters
+from src.llm.checkpointer import get_checkpointer
+from src.llm.compaction import make_compaction_hook
+from src.llm.embedding import embed_text
+from src.llm.openai_client import aextract_filters
+from src.llm.query_log import record_query
+from src.llm.response_cache import SemanticResponseCache
 from src.database.products import products
+from src.database.rankings import RANK_METRICS, rankings
 from src.order.order import list_orders_by_customer_id
 
 os.environ["OPENAI_API_KEY"] = s.openai_api_key
@@ -26,30 +33,123 @@ logger = logging.getLogger(__name__)
 
 llm = ChatOpenAI(model="gpt-4o-mini")
 
+response_cache = SemanticResponseCache(
+    threshold=s.response_cache_threshold,
+    ttl=s.response_cache_ttl,
+    maxsize=s.response_cache_size,
+)
+# answers produced with these tools are generic; anything else (orders) is customer specific
+CACHEABLE_TOOLS = {"search_product", "search_products", "rank_products"}
+# filters the search tools extracted during the current turn, reused to key the cached answer
+turn_filters: ContextVar[Optional[list]] = ContextVar("turn_filters", default=None)
+
+
+def remember_filters(*filters: Optional[dict]):
+    seen = turn_filters.get()
+    if seen is not None:
+        seen.extend(f or {} for f in filters)
+
 
 class State(AgentState):
-    pass
+    # running summary of the turns compacted out of the prompt, see src.llm.compaction
+    summary: str
+    summarized_until: str  # id of the last message included in the summary
+
+
+def to_search_results(documents) -> list[dict]:
+    """Resolve search hits to compact catalogue results, skipping vectors without a product."""
+    matches = products.get_many([d.metadata.get("product_id", d.id) for d in documents])
+    results = []
+    for d, product in zip(documents, matches):
+        if product is None:
+            logger.warning(f"Vector {d.id} has no product in the catalogue, skipping")
+            continue
+        result = product.search_result()
+        # the vector metadata may be fresher than the catalogue snapshot
+        result.update(
+            price=d.metadata.get("price", result["price"]),
+            rating=d.metadata.get("average_rating", result["rating"]),
+            review_count=d.metadata.get("rating_number", result["review_count"]),
+        )
+        results.append(result)
+    return results
 
 
 @tool
 async def search_product(
     query: str, state: Annotated[dict, InjectedState]
-) -> tuple[dict]:
-    """Retrieve products based on user query."""
-    filters = extract_filters(query)
+) -> dict:
+    """
+    Retrieve products based on user query.
+    `relaxed_filters` lists requested constraints (e.g. price) that no product met and were dropped.
+    """
+    if pineconeClient.has_exact_match(query):
+        # answered lexically, the embedding would be wasted
+        filters = await aextract_filters(query)
+    else:
+        # the two network calls are independent: the embedding lands in the embedding cache
+        # and is reused by the search below
+        filters, _ = await asyncio.gather(aextract_filters(query), embed_text(query))
     logger.info(f"Query: {query}, Filters: {filters}")
-    documents = await pineconeClient.search(
+    remember_filters(filters)
+    record_query(query, filters)
+    documents, relaxed = await pineconeClient.search(
         query, "products", json.dumps(filters or {})
     )
     logger.info(f"Documents: {documents}")
+    return {"products": to_search_results(documents), "relaxed_filters": relaxed}
+
+@tool
+async def search_products(
+    queries: list[str], state: Annotated[dict, InjectedState]
+) -> list[dict]:
+    """
+    Retrieve products for several independent searches at once, e.g. ["microphones", "mic stands", "tuners"].
+    Returns one entry per query with its products and relaxed_filters.
+    """
+    filters = await asyncio.gather(*(aextract_filters(query) for query in queries))
+    logger.info(f"Queries: {queries}, Filters: {filters}")
+    remember_filters(*filters)
+    for query, query_filters in zip(queries, filters):
+        record_query(query, query_filters)
+    searches = await pineconeClient.search_many(
+        queries, "products", [json.dumps(f or {}) for f in filters]
+    )
     return [
-        {
-            "product_id": int(d.id),
-            "product_info": f'{products[int(d.id)-1].title} - {products[int(d.id)-1].description} - {d.metadata["price"]} - {d.metadata["average_rating"]} - {d.metadata["rating_number"]}',
-        }
-        for d in documents
+        {"query": query, "products": to_search_results(documents), "relaxed_filters": relaxed}
+        for query, (documents, relaxed) in zip(queries, searches)
     ]
 
+
+@tool
+async def rank_products(
+    category: str,
+    state: Annotated[dict, InjectedState],
+    sort_by: str = "average_rating",
+    top_k: int = 5,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    best_first: bool = True,
+) -> dict:
+    """
+    Exact ranked listing of a product category, e.g. the top 5 highly-rated guitars or the cheapest tuner.
+    sort_by is "average_rating", "rating_number" (most reviewed) or "price" (cheapest first);
+    best_first=False reverses it (e.g. most expensive). Leave category empty to rank the whole store.
+    """
+    if sort_by not in RANK_METRICS:
+        return {"error": f"sort_by must be one of {', '.join(RANK_METRICS)}"}
+    top_k = max(1, min(top_k, s.search_top_k))
+    positions, categories = rankings.top(category, sort_by, top_k, min_price, max_price, best_first)
+    if positions is None:
+        logger.info(f"Ranking {category!r}: no such category")
+        return {"products": [], "matched_categories": [], "note": "No such category, use search_product instead"}
+    logger.info(f"Ranking {category!r} by {sort_by}: {len(positions)} products from {len(categories)} categories")
+    return {
+        "products": [products[idx].search_result() for idx in positions],
+        "matched_categories": list(categories),
+    }
+
+
 @tool
 async def get_order_status(
     order_id: str, customer_id: str, state: Annotated[dict, InjectedState]
@@ -58,13 +158,13 @@ async def get_order_status(
     logger.info(f"Order ID: {order_id}, Customer ID: {customer_id}")
     return await list_orders_by_customer_id(customer_id)
 
-tools = [search_product, get_order_status]
+tools = [search_product, search_products, rank_products, get_order_status]
 
 # ToolNode will automatically take care of injecting state into tools
 tool_node = ToolNode(tools)
 
 
-def create_agent():
+def create_agent(checkpointer):
     prompt_template = (
         "You are a specialized sales agent for our e-commerce store, dedicated exclusively to music instrument products and their related accessories (such as microphones, stands, tuners, etc.) for product-related questions. "
         "You have two main responsibilities: "
@@ -73,7 +173,9 @@ def create_agent():
         "\n\nYou must not answer or engage with any questions unrelated to music instrument products or their accessories for product-related queries, except when a user asks about store-related information."
         "\n\n### Handling Product-Related Questions:"
         "\n- For general questions about music instruments or their accessories (e.g., 'What is a guitar?', 'Is the BOYA BYM1 Microphone good for a cello?'), use your own knowledge to answer."
-        "\n- For any product search, recommendation, or availability question (e.g., 'What are the top 5 highly-rated guitar products?', 'Show me microphones for cello'), ALWAYS call the `search_product` tool. Do not answer from your own knowledge or make up product details for these queries."
+        "\n- For any product search, recommendation, or availability question (e.g., 'Show me microphones for cello', 'Which strings suit a jazz guitar?'), ALWAYS call the `search_product` tool. Do not answer from your own knowledge or make up product details for these queries."
+        "\n- For pure ranking questions over a product category (e.g. 'What are the top 5 highly-rated guitar products?', 'What is the cheapest tuner?', 'most reviewed microphones under $100'), call the `rank_products` tool instead; its results are already sorted. If it finds no matching category, fall back to `search_product`."
+        "\n- When the customer asks for several kinds of products at once (e.g. 'microphones, stands and tuners'), call the `search_products` tool once with one query per kind instead of calling `search_product` repeatedly."
         "\n- When presenting search results, generate a friendly, informative summary in natural language, highlighting product names, ratings, and prices."
         "\n- Example:"
         "\n  User: 'Is the BOYA BYM1 Microphone good for a cello?'"
@@ -111,12 +213,141 @@ def create_agent():
         llm,
         tools=tools,
         state_schema=State,
-        checkpointer=MemorySaver(),
+        checkpointer=checkpointer,
         prompt=prompt_template,
+        pre_model_hook=make_compaction_hook(llm, prompt_template),
     )
 
 
+_agent: CompiledGraph | None = None
+
+
+def get_agent() -> CompiledGraph:
+    """The shared agent, built on first use (normally by the startup warm-up)."""
+    global _agent
+    if _agent is None:
+        _agent = create_agent(get_checkpointer())
+    return _agent
+
+
+_index_version = None
+
+
+def _catalog_version() -> str:
+    """
+    Version cached answers are keyed on: the catalogue snapshot plus the mtime of the embedding
+    manifest, which embed_products.py rewrites after every sync (including price and other
+    metadata-only updates). The cache is dropped as soon as it changes; a sync run on another
+    host is only picked up through `response_cache_ttl`.
+    """
+    global _index_version
+    try:
+        manifest_mtime = os.stat(s.embedding_manifest_path).st_mtime_ns
+    except OSError:
+        manifest_mtime = 0
+    version = f"{products.version}:{manifest_mtime}"
+    if version != _index_version:
+        if _index_version is not None:
+            logger.info("Product index changed, dropping cached answers")
+            response_cache.invalidate()
+        _index_version = version
+    return version
+
+
+async def _cache_lookup(text, config: dict, agent: CompiledGraph):
+    """
+    Look the message up in the response cache if this is the first turn of the session.
+    Returns (answer, key): `answer` is the cached answer or None, `key` is the (vector, filters)
+    pair to store the fresh answer under, or None when the turn must not be cached. Either
+    half of the key may be None when a miss was decided without it; `_cache_store` fills it in
+    after the answer was sent, so misses pay for at most the (usually cached) embedding.
+    """
+    if not s.response_cache_enabled:
+        return None, None
+    state = await agent.aget_state(config)
+    if state.values.get("messages"):
+        # follow-up turns depend on the conversation so far
+        return None, None
+
+    vector, candidates = None, []
+    if len(response_cache):
+        vector = await embed_text(text)
+        candidates = response_cache.candidates(vector, _catalog_version())
+    # filter extraction is an LLM call, only needed to tell similar cached questions apart
+    filters = await aextract_filters(text) if candidates else None
+    answer = response_cache.lookup(candidates, filters)
+    if answer is not None:
+        logger.info(f"Response cache hit for: {text}")
+        # record the turn so follow-ups see it like any other answer
+        await agent.aupdate_state(
+            config,
+            {"messages": [HumanMessage(content=text), AIMessage(content=answer)]},
+            as_node="agent",
+        )
+    return answer, (vector, filters)
+
+
+async def _cache_store(text, key, answer: str, config: dict, agent: CompiledGraph, searched: list[dict]):
+    """
+    Store a first-turn answer. `searched` holds the filters the search tools extracted during
+    the turn; when the lookup did not extract filters itself they key the answer, so storing
+    never makes an extra LLM call.
+    """
+    if key is None or not answer:
+        return
+    state = await agent.aget_state(config)
+    tools_used = {m.name for m in state.values.get("messages", []) if isinstance(m, ToolMessage)}
+    if not tools_used <= CACHEABLE_TOOLS:
+        return
+    vector, filters = key
+    if filters is None:
+        distinct = {json.dumps(f, sort_keys=True) for f in searched}
+        if len(distinct) > 1 or (not searched and tools_used):
+            # several searches, or a ranking whose bounds are tool arguments: no single key
+            return
+        filters = searched[0] if searched else {}
+    try:
+        if vector is None:
+            vector = await embed_text(text)
+    except Exception as e:
+        logger.warning(f"Could not cache the answer to {text!r}: {e}")
+        return
+    response_cache.store(vector, filters, answer, _catalog_version())
+
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _after_turn(coro):
+    """Run work the answer does not wait for, keeping a reference until it is done."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _trim_session(config: dict, agent: CompiledGraph):
+    """Remove the oldest turns once the session holds more than `session_max_messages` messages."""
+    state = await agent.aget_state(config)
+    messages = state.values.get("messages", [])
+    if len(messages) <= s.session_max_messages:
+        return
+    # cut at a user message so no tool result loses the AI message that requested it
+    start = len(messages) - s.session_max_messages
+    while start < len(messages) and not isinstance(messages[start], HumanMessage):
+        start += 1
+    if start >= len(messages):
+        return
+    await agent.aupdate_state(config, {"messages": [RemoveMessage(id=m.id) for m in messages[:start]]})
+
+
 async def chat(text, session_id: str, agent: CompiledGraph):
+    config = {"configurable": {"thread_id": session_id}}
+    searched = []
+    turn_filters.set(searched)
+    cached, cache_key = await _cache_lookup(text, config, agent)
+    if cached is not None:
+        return cached
+
     inputs = {
         "messages": [
             ("user", text),
@@ -125,11 +356,62 @@ async def chat(text, session_id: str, agent: CompiledGraph):
 
     answer = ""
     messages = []
-    async for output in agent.astream(
-        inputs, {"configurable": {"thread_id": session_id}}, stream_mode="values"
-    ):
+    async for output in agent.astream(inputs, config, stream_mode="values"):
         messages = output["messages"]
     answer = messages[-1].content
     logger.debug(f"Answer: {answer}")
-    
+    await _trim_session(config, agent)
+    _after_turn(_cache_store(text, cache_key, answer, config, agent, searched))
+
     return answer
+
+
+async def chat_stream(text, session_id: str, agent: CompiledGraph):
+    """
+    Run one agent turn and yield events as they happen.
+
+    Yields dicts with a "type" key:
+        - "token": an LLM token delta from the agent node ("content")
+        - "tool_start" / "tool_end": a tool call starting or finishing ("tool", "input")
+        - "done": the final answer of the turn ("answer", "tool_calls")
+    """
+    config = {"configurable": {"thread_id": session_id}}
+    searched = []
+    turn_filters.set(searched)
+    cached, cache_key = await _cache_lookup(text, config, agent)
+    if cached is not None:
+        yield {"type": "token", "content": cached}
+        yield {"type": "done", "answer": cached, "tool_calls": 0}
+        return
+
+    inputs = {
+        "messages": [
+            ("user", text),
+        ],
+    }
+
+    answer = ""
+    tool_calls = 0
+    async for event in agent.astream_events(inputs, config, version="v2"):
+        kind = event["event"]
+        node = event.get("metadata", {}).get("langgraph_node")
+        if kind == "on_chat_model_stream" and node == "agent":
+            content = event["data"]["chunk"].content
+            if content:
+                yield {"type": "token", "content": content}
+        elif kind == "on_chat_model_end" and node == "agent":
+            answer = event["data"]["output"].content
+        elif kind == "on_tool_start":
+            tool_calls += 1
+            # drop the injected agent state, only the model-provided arguments are useful
+            tool_input = {
+                k: v for k, v in (event["data"].get("input") or {}).items() if k != "state"
+            }
+            yield {"type": "tool_start", "tool": event["name"], "input": tool_input}
+        elif kind == "on_tool_end":
+            yield {"type": "tool_end", "tool": event["name"]}
+
+    logger.debug(f"Answer: {answer}")
+    await _trim_session(config, agent)
+    _after_turn(_cache_store(text, cache_key, answer, config, agent, searched))
+    yield {"type": "done", "answer": answer, "tool_calls": tool_calls}
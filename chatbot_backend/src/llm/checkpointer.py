@@ -0,0 +1,278 @@
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+
+import aiosqlite
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from src.config import s
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    In-process checkpointer that forgets sessions.
+
+    Sessions idle for longer than `idle_ttl` seconds and the least recently used sessions
+    beyond `max_sessions` are dropped, and only the latest `max_checkpoints` checkpoints
+    (with the channel values they reference) are kept per session.
+    """
+
+    def __init__(self, idle_ttl: float, max_sessions: int, max_checkpoints: int, **kwargs):
+        super().__init__(**kwargs)
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_checkpoints = max_checkpoints
+        self._last_seen: OrderedDict[str, float] = OrderedDict()
+        # per-thread keys of `writes` and `blobs`, so dropping or pruning a session touches only its own
+        self._write_keys: defaultdict[str, set[tuple]] = defaultdict(set)
+        self._blob_keys: defaultdict[str, set[tuple]] = defaultdict(set)
+        self.evicted = 0
+
+    def _drop_thread(self, thread_id: str):
+        self.storage.pop(thread_id, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        self._last_seen.pop(thread_id, None)
+        self.evicted += 1
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+        # checkpoint ids are time-ordered
+        kept = sorted(checkpoints, reverse=True)[: self.max_checkpoints]
+        for checkpoint_id in set(checkpoints) - set(kept):
+            del checkpoints[checkpoint_id]
+            key = (thread_id, checkpoint_ns, checkpoint_id)
+            self.writes.pop(key, None)
+            self._write_keys[thread_id].discard(key)
+
+        # channel versions only grow, so blobs older than those of the oldest kept checkpoint are unreferenced
+        oldest = self.serde.loads_typed(checkpoints[kept[-1]][0])
+        versions = oldest["channel_versions"]
+        blob_keys = self._blob_keys[thread_id]
+        for key in [
+            key
+            for key in blob_keys
+            if key[1] == checkpoint_ns and key[2] in versions and str(key[3]) < str(versions[key[2]])
+        ]:
+            self.blobs.pop(key, None)
+            blob_keys.discard(key)
+
+    def _evict(self, now: float):
+        while self._last_seen:
+            thread_id, last_seen = next(iter(self._last_seen.items()))
+            if now - last_seen <= self.idle_ttl and len(self._last_seen) <= self.max_sessions:
+                break
+            self._drop_thread(thread_id)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        self._blob_keys[thread_id].update(
+            (thread_id, checkpoint_ns, channel, version) for channel, version in new_versions.items()
+        )
+        now = time.monotonic()
+        self._last_seen[thread_id] = now
+        self._last_seen.move_to_end(thread_id)
+        self._prune_thread(thread_id, checkpoint_ns)
+        self._evict(now)
+        return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        super().put_writes(config, writes, task_id, task_path)
+        thread_id = config["configurable"]["thread_id"]
+        self._write_keys[thread_id].add(
+            (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+        )
+
+    async def astats(self) -> dict:
+        stored = sum(
+            len(checkpoint[1]) + len(metadata[1])
+            for namespaces in self.storage.values()
+            for checkpoints in namespaces.values()
+            for checkpoint, metadata, _ in checkpoints.values()
+        )
+        stored += sum(len(blob[1]) for blob in self.blobs.values())
+        stored += sum(len(write[2][1]) for writes in self.writes.values() for write in writes.values())
+        return {"backend": "memory", "active_sessions": len(self.storage), "bytes": stored, "evicted": self.evicted}
+
+    async def aclose(self):
+        pass
+
+
+class BoundedSqliteSaver(AsyncSqliteSaver):
+    """
+    sqlite checkpointer in WAL mode, shareable by all workers on the host.
+
+    A `sessions` table records when each thread was last written; idle sessions and the
+    least recently used ones beyond `max_sessions` are deleted at most once per
+    `evict_interval` seconds, and old checkpoints are pruned on every write.
+    """
+
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        idle_ttl: float,
+        max_sessions: int,
+        max_checkpoints: int,
+        evict_interval: float = 60,
+    ):
+        # AsyncSqliteSaver binds to the running event loop, see `open`
+        super().__init__(conn)
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_checkpoints = max_checkpoints
+        self.evict_interval = evict_interval
+        self._last_evict = 0.0
+        self._sessions_ready = False
+        self.evicted = 0
+
+    @classmethod
+    async def open(cls, path: Path, **kwargs) -> "BoundedSqliteSaver":
+        """Connect to the database at `path` and create the tables; must run inside the event loop."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        saver = cls(await aiosqlite.connect(str(path)), **kwargs)
+        await saver.setup()
+        return saver
+
+    async def setup(self):
+        await super().setup()
+        if self._sessions_ready:
+            return
+        async with self.lock:
+            if self._sessions_ready:
+                return
+            await self.conn.execute("PRAGMA journal_mode=WAL")
+            await self.conn.execute("PRAGMA synchronous=NORMAL")
+            await self.conn.execute("PRAGMA busy_timeout=5000")
+            await self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+            )
+            await self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+            await self.conn.commit()
+            self._sessions_ready = True
+
+    async def _delete_threads(self, thread_ids: list[str]):
+        for thread_id in thread_ids:
+            await self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            await self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            await self.conn.execute("DELETE FROM sessions WHERE thread_id = ?", (thread_id,))
+        self.evicted += len(thread_ids)
+
+    async def _evict(self, now: float):
+        async with self.conn.execute(
+            "SELECT thread_id FROM sessions WHERE last_seen < ?", (now - self.idle_ttl,)
+        ) as cur:
+            idle = [row[0] for row in await cur.fetchall()]
+        async with self.conn.execute(
+            "SELECT thread_id FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?", (self.max_sessions,)
+        ) as cur:
+            overflow = [row[0] for row in await cur.fetchall()]
+        expired = sorted(set(idle) | set(overflow))
+        if expired:
+            await self._delete_threads(expired)
+            logger.info(f"Evicted {len(expired)} sessions from the checkpoint store")
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        result = await super().aput(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        now = time.time()
+        async with self.lock:
+            await self.conn.execute(
+                "INSERT INTO sessions (thread_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (thread_id, now),
+            )
+            # keep only the newest checkpoints of this thread; ids are time-ordered
+            stale = (
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?"
+            )
+            params = (thread_id, checkpoint_ns, self.max_checkpoints)
+            await self.conn.execute(
+                f"DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id IN ({stale})",
+                (thread_id, checkpoint_ns) + params,
+            )
+            await self.conn.execute(
+                f"DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id IN ({stale})",
+                (thread_id, checkpoint_ns) + params,
+            )
+            if now - self._last_evict > self.evict_interval:
+                self._last_evict = now
+                await self._evict(now)
+            await self.conn.commit()
+        return result
+
+    async def astats(self) -> dict:
+        await self.setup()
+        async with self.lock:
+            async with self.conn.execute("SELECT COUNT(*) FROM sessions") as cur:
+                (sessions,) = await cur.fetchone()
+            async with self.conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints"
+            ) as cur:
+                (checkpoint_bytes,) = await cur.fetchone()
+            async with self.conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes") as cur:
+                (write_bytes,) = await cur.fetchone()
+        return {
+            "backend": "sqlite",
+            "active_sessions": sessions,
+            "bytes": checkpoint_bytes + write_bytes,
+            "evicted": self.evicted,
+        }
+
+    async def aclose(self):
+        if self.conn.is_alive():
+            await self.conn.close()
+
+
+_checkpointer = None
+
+
+async def open_checkpointer():
+    """
+    Create the configured checkpointer. Called from the app lifespan: the sqlite saver binds
+    to the running event loop, so it cannot be built at import time.
+    """
+    global _checkpointer
+    if _checkpointer is not None:
+        return _checkpointer
+    if s.checkpointer == "sqlite":
+        logger.info(f"Storing conversations in {s.checkpoint_db_path}")
+        _checkpointer = await BoundedSqliteSaver.open(
+            s.checkpoint_db_path,
+            idle_ttl=s.session_idle_ttl,
+            max_sessions=s.max_sessions,
+            max_checkpoints=s.max_checkpoints_per_session,
+        )
+    else:
+        _checkpointer = BoundedMemorySaver(
+            idle_ttl=s.session_idle_ttl,
+            max_sessions=s.max_sessions,
+            max_checkpoints=s.max_checkpoints_per_session,
+        )
+    return _checkpointer
+
+
+def get_checkpointer():
+    """The checkpointer opened by `open_checkpointer`."""
+    if _checkpointer is None:
+        raise RuntimeError("The checkpointer is not open, call open_checkpointer() from the app lifespan first")
+    return _checkpointer
+
+
+async def close_checkpointer():
+    global _checkpointer
+    if _checkpointer is not None:
+        await _checkpointer.aclose()
+        _checkpointer = None
@@ -0,0 +1,137 @@
+import json
+import logging
+from typing import Optional
+
+import tiktoken
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.language_models import BaseChatModel
+
+from src.config import s
+
+logger = logging.getLogger(__name__)
+
+try:
+    encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+except KeyError:
+    encoding = tiktoken.get_encoding("o200k_base")
+
+MESSAGE_OVERHEAD = 4  # role and separators per chat message
+KEPT_KEYS = {"title", "product", "name"}  # besides *id keys, kept in compacted tool results
+
+
+def count_tokens(messages: list[AnyMessage]) -> int:
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+        total += len(encoding.encode(content)) + MESSAGE_OVERHEAD
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            total += len(encoding.encode(tool_call["name"] + json.dumps(tool_call["args"])))
+    return total
+
+
+def split_turns(messages: list[AnyMessage]) -> list[list[AnyMessage]]:
+    """Group messages into turns, each starting at a user message."""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _compact(value):
+    """Keep the *id and title-like keys of records, and any nested lists of records."""
+    if isinstance(value, list):
+        return [_compact(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    compact = {
+        k: _compact(v)
+        for k, v in value.items()
+        if k.lower().endswith("id") or k.lower() in KEPT_KEYS or isinstance(v, list)
+    }
+    return compact or value
+
+
+def compact_tool_message(message: ToolMessage) -> ToolMessage:
+    """Reduce an old tool result to the ids and titles of the records it returned."""
+    try:
+        content = json.loads(message.content)
+    except (TypeError, ValueError):
+        content = None
+    if isinstance(content, (list, dict)):
+        compact = json.dumps(_compact(content), ensure_ascii=False)
+    else:
+        text = str(message.content)
+        compact = text if len(text) <= 200 else text[:200] + "..."
+    return message.model_copy(update={"content": compact})
+
+
+async def summarize(llm: BaseChatModel, summary: str, messages: list[AnyMessage]) -> str:
+    transcript = "\n".join(
+        f"{message.type}: {message.content}" for message in messages if message.content
+    )
+    prompt = (
+        "Summarize this conversation between a customer and a music store assistant in a few sentences. "
+        "Keep customer ids, order ids, product names and ids, prices and any stated preferences.\n\n"
+        f"Summary so far: {summary or '(none)'}\n\nNew messages:\n{transcript}"
+    )
+    response = await llm.ainvoke([HumanMessage(content=prompt)])
+    return response.content
+
+
+def make_compaction_hook(llm: BaseChatModel, system_prompt: str):
+    """
+    Build the agent's pre-model hook.
+
+    The stored history is left untouched; the model sees a running summary of older turns,
+    the recent turns with tool results from finished turns reduced to ids and titles, and
+    whole turns dropped from the oldest end until the prompt fits `prompt_token_budget`.
+    Turns older than `compaction_keep_turns` are folded into the summary in batches, once
+    `compaction_summary_batch` of them have aged out or the prompt no longer fits the budget,
+    so most turns make no summarization call; until then they are sent like recent turns.
+    The summary is kept in the agent state.
+    """
+    system_tokens = count_tokens([SystemMessage(content=system_prompt)])
+    budget = s.prompt_token_budget - system_tokens
+
+    def prompt_messages(summary: Optional[str], turns: list[list[AnyMessage]]) -> list[AnyMessage]:
+        prefix = [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] if summary else []
+        finished = [compact_tool_message(m) if isinstance(m, ToolMessage) else m for turn in turns[:-1] for m in turn]
+        return prefix + finished + [m for turn in turns[-1:] for m in turn]
+
+    async def compact(state: dict) -> dict:
+        messages = state["messages"]
+        turns = split_turns(messages)
+        before = system_tokens + count_tokens(messages)
+
+        update = {}
+        summary: Optional[str] = state.get("summary")
+        old_turns, recent_turns = turns[: -s.compaction_keep_turns], turns[-s.compaction_keep_turns :]
+        if old_turns:
+            old_messages = [message for turn in old_turns for message in turn]
+            ids = [message.id for message in old_messages]
+            # the summarized messages may have been trimmed from the session since
+            summarized_until = state.get("summarized_until")
+            start = ids.index(summarized_until) + 1 if summarized_until in ids else 0
+            pending = split_turns(old_messages[start:])
+            if len(pending) >= s.compaction_summary_batch or (
+                pending and count_tokens(prompt_messages(summary, pending + recent_turns)) > budget
+            ):
+                try:
+                    summary = await summarize(llm, summary, old_messages[start:])
+                    update = {"summary": summary, "summarized_until": ids[-1]}
+                    pending = []
+                except Exception as e:
+                    logger.warning(f"Could not summarize conversation, dropping old turns instead: {e}")
+            recent_turns = pending + recent_turns
+
+        while len(recent_turns) > 1 and count_tokens(prompt_messages(summary, recent_turns)) > budget:
+            recent_turns = recent_turns[1:]
+        llm_input = prompt_messages(summary, recent_turns)
+
+        after = system_tokens + count_tokens(llm_input)
+        logger.info(f"Prompt tokens: {before} -> {after} ({len(turns)} turns, {len(recent_turns)} sent in full)")
+        return {**update, "llm_input_messages": llm_input}
+
+    return compact
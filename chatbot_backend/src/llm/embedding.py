@@ -1,23 +1,70 @@
+import asyncio
+import logging
+import random
 from typing import List
-from openai import AsyncOpenAI
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
 from retry import retry
 
 from src.config import s
+from src.llm.embedding_cache import EmbeddingCache, normalize_text
 from src.models.product import Product
 
+logger = logging.getLogger(__name__)
+
 # Create async OpenAI client
 openai_client = AsyncOpenAI(api_key=s.openai_api_key)
 
+embedding_cache = EmbeddingCache(s.embedding_cache_path, maxsize=s.embedding_cache_size)
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# identifies the vector space: cached vectors and the manifest are only valid for the same model and size
+EMBEDDING_KEY = f"{s.openai_embedding_model}:{s.openai_embedding_size}"
+
+
+def embedding_options() -> dict:
+    """text-embedding-3 models return `openai_embedding_size` dimensions (e.g. 256 or 512) when asked."""
+    if s.openai_embedding_model.startswith("text-embedding-3"):
+        return {"dimensions": s.openai_embedding_size}
+    return {}
+
 
 @retry(tries=3, delay=1)
 async def embed_text(text: str) -> List[float]:
     """
     Get the OpenAI embedding for the given text asynchronously.
+    Served from the embedding cache when the normalized text was embedded before.
     """
+    embedding = await embedding_cache.aget(text, EMBEDDING_KEY)
+    if embedding is not None:
+        return embedding
+
     response = await openai_client.embeddings.create(
-        model=s.openai_embedding_model, input=text
+        model=s.openai_embedding_model, input=normalize_text(text), **embedding_options()
     )
-    return response.data[0].embedding
+    embedding = response.data[0].embedding
+    await embedding_cache.aset(text, EMBEDDING_KEY, embedding)
+    return embedding
+
+
+async def embed_queries(texts: List[str]) -> List[List[float]]:
+    """
+    Embeddings for several queries, with a single request for those not in the embedding cache.
+    """
+    embeddings = await embedding_cache.aget_many(texts, EMBEDDING_KEY)
+    # one input per distinct normalized text
+    missing = {}
+    for text, embedding in zip(texts, embeddings):
+        if embedding is None:
+            missing.setdefault(normalize_text(text), text)
+    if missing:
+        fresh = dict(zip(missing, await embed_texts(list(missing))))
+        await embedding_cache.aset_many(EMBEDDING_KEY, [(text, fresh[normalized]) for normalized, text in missing.items()])
+        embeddings = [
+            fresh[normalize_text(text)] if embedding is None else embedding
+            for text, embedding in zip(texts, embeddings)
+        ]
+    return embeddings
 
 
 @retry(tries=3, delay=1)
@@ -27,5 +74,36 @@ async def embed_product(product: Product) -> List[float]:
     """
     # Combine product information into a single string
     product_text = Product.get_product_info(product)
-    # Get embedding for the combined text
-    return await embed_text(product_text)
+    # Get embedding for the combined text, bypassing the query embedding cache
+    return (await embed_texts([product_text]))[0]
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Honour the server's Retry-After header, otherwise exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(60.0, 2**attempt) + random.random()
+
+
+async def embed_texts(texts: List[str], max_attempts: int = 6) -> List[List[float]]:
+    """
+    Get the OpenAI embeddings for a batch of texts in a single request.
+
+    Rate-limit and transient errors are retried with backoff, so callers can run
+    several batches concurrently without tripping the account limits for good.
+    """
+    for attempt in range(max_attempts):
+        try:
+            response = await openai_client.embeddings.create(
+                model=s.openai_embedding_model, input=texts, **embedding_options()
+            )
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = _retry_delay(e, attempt)
+            logger.warning(f"Embedding batch of {len(texts)} failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
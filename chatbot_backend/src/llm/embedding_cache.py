@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Case and whitespace insensitive form of a query, so trivial variants share one embedding."""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query embeddings keyed on (model, normalized text).
+
+    The first tier is an in-process LRU; the second is a sqlite database in WAL mode that
+    survives restarts and is shared by every uvicorn worker on the host. Disk reads and
+    writes run in worker threads so a slow or locked database never stalls the event loop.
+    """
+
+    def __init__(self, path: Path, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self.memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._lock = threading.Lock()  # memory tier and counters, never held during disk I/O
+        self._db_lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=5.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def _memory_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self.memory.get(key)
+            if vector is None:
+                return None
+            self.memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return vector.tolist()
+
+    def _disk_get(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Look `keys` up in sqlite; blocking, so it runs in a worker thread."""
+        with self._db_lock:
+            rows = []
+            for key in keys:
+                try:
+                    rows.append(self.conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone())
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache read failed: {e}")
+                    rows.append(None)
+        vectors = []
+        with self._lock:
+            for key, row in zip(keys, rows):
+                if row is None:
+                    self.counters["misses"] += 1
+                    vectors.append(None)
+                    continue
+                vector = np.frombuffer(row[0], dtype=np.float32)
+                self._remember(key, vector)
+                self.counters["disk_hits"] += 1
+                vectors.append(vector.tolist())
+        return vectors
+
+    def _disk_put(self, rows: List[tuple]):
+        with self._db_lock:
+            try:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, text, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            except sqlite3.Error as e:
+                # the in-memory tier still serves this worker
+                logger.warning(f"Embedding cache write failed: {e}")
+
+    def _remember_all(self, model: str, items: List[tuple[str, List[float]]]) -> List[tuple]:
+        """Add `(text, embedding)` pairs to the memory tier and return their sqlite rows."""
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, embedding in items:
+                key = self.key(text, model)
+                vector = np.asarray(embedding, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, model, normalize_text(text), vector.tobytes(), now))
+        return rows
+
+    async def aget_many(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """
+        Cached embeddings of `texts` (None for misses). Memory hits are served inline; the
+        remaining keys are read from sqlite in one worker thread call, off the event loop.
+        """
+        keys = [self.key(text, model) for text in texts]
+        embeddings = [self._memory_get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            found = await asyncio.to_thread(self._disk_get, [keys[i] for i in missing])
+            for i, embedding in zip(missing, found):
+                embeddings[i] = embedding
+        return embeddings
+
+    async def aget(self, text: str, model: str) -> Optional[List[float]]:
+        return (await self.aget_many([text], model))[0]
+
+    async def aset_many(self, model: str, items: List[tuple[str, List[float]]]):
+        """Store `(text, embedding)` pairs: in memory at once, in sqlite from a worker thread."""
+        rows = self._remember_all(model, items)
+        await asyncio.to_thread(self._disk_put, rows)
+
+    async def aset(self, text: str, model: str, embedding: List[float]):
+        await self.aset_many(model, [(text, embedding)])
+
+    def stats(self) -> dict:
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        total = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": hits / total if total else 0.0,
+            "memory_size": len(self.memory),
+        }
@@ -0,0 +1,209 @@
+import json
+import re
+from pathlib import Path
+from typing import Optional
+
+# Deterministic extraction of price / review-count / star-rating filters.
+# `parse_filters` returns the same dict shape as the LLM extractor, or None when the query
+# has filter-like wording the rules cannot resolve with confidence and the LLM should decide.
+
+NUMBER = r"(\d+(?:\.\d+)?)(k)?"
+CURRENCY_PREFIX = r"(?:us\$|\$|usd ?)"
+CURRENCY_SUFFIX = r"(?: ?\$| ?usd\b| ?dollars?\b| ?bucks\b)"
+UNIT = r"(?: ?(stars?|star rating|reviews?|ratings?|reviewers)\b)"
+VALUE = rf"({CURRENCY_PREFIX})?{NUMBER}({CURRENCY_SUFFIX})?{UNIT}?"
+
+UPPER = r"under|below|less than|fewer than|lower than|cheaper than|up to|at most|no more than|not more than|maximum of|max|within|<=|<"
+LOWER = r"over|above|more than|greater than|higher than|at least|no less than|not less than|minimum of|min|starting at|starting from|>=|>"
+UPPER_SUFFIX = r"or less|or lower|or under|or below|or fewer|and under|and below|max"
+LOWER_SUFFIX = r"or more|or higher|or above|or better|and up|and above|and over|\+"
+RATING_CONTEXT = r"(?:(?:rated|rating|ratings|rating of|rated at|average rating|average rating of)\s+)"
+PRICE_CONTEXT = r"(?:(?:priced|priced at|price|prices|price of|cost|costs|costing|that costs?)\s+)"
+CONTEXT = rf"({RATING_CONTEXT}|{PRICE_CONTEXT})"
+
+RANGE_RE = re.compile(rf"(?:between|from)\s+{VALUE}\s+(?:and|to|-)\s+{VALUE}|{VALUE}\s*(?:-|to)\s*{VALUE}")
+BOUND_RE = re.compile(rf"{CONTEXT}?(?<![a-z])({UPPER}|{LOWER})\s*{VALUE}")
+SUFFIX_RE = re.compile(rf"{CONTEXT}?(?<![a-z0-9.]){VALUE}\s*({UPPER_SUFFIX}|{LOWER_SUFFIX})")
+HIGHLY_RATED_RE = re.compile(r"\b(?:highly|top|best) rated\b")
+# a negation up to one word before a bound flips or voids it ("not under $50", "nothing over $20")
+NEGATED_RE = re.compile(r"\b(?:not|no|never|nothing|without)\s+(?:\w+\s+)?$")
+
+# Wording that hints at a filter; if any is left after the rules ran, defer to the LLM.
+SIGNAL_RE = re.compile(
+    r"[$€£]|\b(?:usd|dollars?|bucks|price[ds]?|cost|costs|cheap\w*|expensive|afford\w*|budget|inexpensive|premium|"
+    r"under|below|above|over|between|less than|more than|at least|at most|stars?|rated|ratings?|reviews?|reviewers|popular)\b"
+)
+
+HIGHLY_RATED_MIN = 4.5
+
+
+def _normalize(query: str) -> str:
+    text = query.lower()
+    text = re.sub(r"(\d),(\d{3})\b", r"\1\2", text)  # 1,000 -> 1000
+    text = re.sub(r"(?<=[a-z])-(?=[a-z])", " ", text)  # highly-rated -> highly rated
+    text = re.sub(r"(\d)-(stars?)\b", r"\1 \2", text)  # 4-star -> 4 star
+    text = re.sub(r"(\d)\+ ?(stars?|reviews?|ratings?)\b", r"\1 \2 or more", text)  # 4+ stars -> 4 stars or more
+    return " ".join(text.split())
+
+
+def _value(groups: tuple) -> tuple[float, Optional[str]]:
+    """Resolve one VALUE match (prefix, number, k, suffix, unit) to (number, field hint)."""
+    prefix, number, thousands, suffix, unit = groups
+    value = float(number) * (1000 if thousands else 1)
+    if unit:
+        field = "average_rating" if unit.startswith("star") else "rating_number"
+    elif prefix or suffix:
+        field = "price"
+    else:
+        field = None
+    return value, field
+
+
+def _resolve_field(field: Optional[str], value: float, context: Optional[str]) -> str:
+    if field:
+        return field
+    if context and "rat" in context:
+        # "rated above 4" is stars, "rated by over 200" is a review count
+        return "average_rating" if value <= 5 else "rating_number"
+    return "price"
+
+
+def _cast(field: str, value: float, bound: str, strict: bool):
+    if field == "rating_number":
+        # "more than 50 ratings" -> at least 51, mirroring the LLM prompt examples
+        return int(value) + 1 if strict and bound == "min" else int(value)
+    return float(value)
+
+
+class _Filters:
+    def __init__(self):
+        self.filters: dict[str, dict] = {}
+        self.conflict = False  # set for anything the LLM should resolve instead
+
+    def add(self, field: str, bound: str, value):
+        if field == "average_rating" and not 0 <= value <= 5:
+            self.conflict = True
+            return
+        current = self.filters.setdefault(field, {})
+        if bound in current and current[bound] != value:
+            self.conflict = True
+        current[bound] = value
+
+    def negated(self, text: str, start: int) -> bool:
+        if NEGATED_RE.search(text[:start]):
+            self.conflict = True
+        return self.conflict
+
+    def contradictory(self) -> bool:
+        """A minimum above the maximum, e.g. "under $100 and over $200"."""
+        return any(
+            "min" in bounds and "max" in bounds and bounds["min"] > bounds["max"]
+            for bounds in self.filters.values()
+        )
+
+
+def parse_filters(query: str) -> Optional[dict]:
+    """
+    Extract {'price' | 'rating_number' | 'average_rating': {'min': ..., 'max': ...}} filters with rules.
+
+    Returns None when the rules are unsure, e.g. vague wording such as "cheap", a negated
+    bound ("not under $50"), contradictory bounds, a bare "4.5 and up" or a comparison the
+    patterns do not cover, so the caller can fall back to the LLM.
+    """
+    text = _normalize(query)
+    result = _Filters()
+    consumed = []
+
+    for match in RANGE_RE.finditer(text):
+        groups = match.groups()
+        first, second = (groups[0:5], groups[5:10]) if match.group(2) else (groups[10:15], groups[15:20])
+        low, low_field = _value(first)
+        high, high_field = _value(second)
+        if not (low_field or high_field) and not match.group(0).startswith(("between", "from")):
+            continue  # "50-100" without a unit could be a model number
+        if result.negated(text, match.start()):
+            break
+        field = _resolve_field(low_field or high_field, high, None)
+        result.add(field, "min", _cast(field, min(low, high), "min", False))
+        result.add(field, "max", _cast(field, max(low, high), "max", False))
+        consumed.append(match.span())
+
+    for match in BOUND_RE.finditer(text):
+        if any(start <= match.start() < end for start, end in consumed):
+            continue
+        if result.negated(text, match.start()):
+            break
+        context, op = match.group(1), match.group(2)
+        value, field = _value(match.groups()[2:7])
+        field = _resolve_field(field, value, context)
+        bound = "max" if re.fullmatch(UPPER, op) else "min"
+        strict = op in {"more than", "greater than", "higher than", "over", "above", ">"}
+        result.add(field, bound, _cast(field, value, bound, strict))
+        consumed.append(match.span())
+
+    for match in SUFFIX_RE.finditer(text):
+        if any(start <= match.start() < end for start, end in consumed):
+            continue
+        context, op = match.group(1), match.group(7)
+        value, field = _value(match.groups()[1:6])
+        if result.negated(text, match.start()):
+            break
+        if field is None and not context:
+            # "4.5 and up" with nothing saying whether it is stars, reviews or dollars
+            result.conflict = True
+            break
+        field = _resolve_field(field, value, context)
+        bound = "max" if re.fullmatch(UPPER_SUFFIX, op) else "min"
+        result.add(field, bound, _cast(field, value, bound, False))
+        consumed.append(match.span())
+
+    highly_rated = HIGHLY_RATED_RE.search(text)
+    if highly_rated:
+        if "average_rating" not in result.filters:
+            result.add("average_rating", "min", HIGHLY_RATED_MIN)
+        consumed.append(highly_rated.span())
+
+    residual = text
+    for start, end in sorted(consumed, reverse=True):
+        residual = residual[:start] + " " + residual[end:]
+    if result.conflict or result.contradictory() or SIGNAL_RE.search(residual):
+        return None
+    return result.filters
+
+
+GOLDEN_CORPUS_PATH = Path(__file__).with_name("filter_rules_golden.json")
+
+
+def evaluate(corpus_path: Path = GOLDEN_CORPUS_PATH) -> dict:
+    """
+    Run the rules over the golden corpus of {"query", "filters"} cases. `filters` is null for
+    queries the rules must leave to the LLM (contradictions), so any answer counts as a mistake.
+
+    hit_rate is the share of queries answered without the LLM, accuracy is measured on
+    those answers only, llm_calls_saved_per_1000 extrapolates the hit rate.
+    """
+    with open(corpus_path) as f:
+        corpus = json.load(f)
+
+    hits, correct, mistakes = 0, 0, []
+    for case in corpus:
+        parsed = parse_filters(case["query"])
+        if parsed is None:
+            continue
+        hits += 1
+        if parsed == case["filters"]:
+            correct += 1
+        else:
+            mistakes.append({"query": case["query"], "expected": case["filters"], "parsed": parsed})
+
+    return {
+        "queries": len(corpus),
+        "hit_rate": hits / len(corpus) if corpus else 0.0,
+        "accuracy": correct / hits if hits else 0.0,
+        "llm_calls_saved_per_1000": round(1000 * hits / len(corpus)) if corpus else 0,
+        "mistakes": mistakes,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(evaluate(), indent=2))
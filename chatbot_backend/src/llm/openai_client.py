@@ -1,15 +1,23 @@
+import asyncio
 import json
 import logging
 import re
 
-from openai import OpenAI
+from async_lru import alru_cache
+from openai import AsyncOpenAI, OpenAI
 
 from src.config import s
+from src.llm.embedding_cache import normalize_text
+from src.llm.filter_rules import parse_filters
 
 logger = logging.getLogger(__name__)
 
 
 model = OpenAI(api_key=s.openai_api_key)
+async_model = AsyncOpenAI(api_key=s.openai_api_key)
+
+# how many extractions were answered by the rules vs the LLM in this worker
+filter_extraction_counters = {"rules": 0, "llm": 0}
 
 
 def clean_json_response(response_text: str) -> str:
@@ -50,9 +58,22 @@ extract_price_rating_prompt = (
     "Output only the JSON object."
 )
 
+def filter_messages(query: str) -> list[dict]:
+    user_message = f"""
+            User Query: "{query}"
+
+            Extract and return only the relevant filters as a JSON object.
+            """
+    return [
+        {"role": "system", "content": extract_price_rating_prompt},
+        {"role": "user", "content": user_message},
+    ]
+
+
 def extract_filters(query: str) -> dict:
     """
-    Extract filters from a user's query based on the given schema using openai.
+    Extract filters from a user's query based on the given schema.
+    Rule-based parsing is tried first; openai is only called when the rules are unsure.
 
     Args:
         query (str): The user's input query.
@@ -61,19 +82,16 @@ def extract_filters(query: str) -> dict:
     Returns:
         dict: Extracted filters matching the schema.
     """
-    try:
-        user_message = f"""
-            User Query: "{query}"
-
-            Extract and return only the relevant filters as a JSON object.
-            """
+    filters = parse_filters(query)
+    if filters is not None:
+        filter_extraction_counters["rules"] += 1
+        return filters
 
+    filter_extraction_counters["llm"] += 1
+    try:
         completion = model.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": extract_price_rating_prompt},
-                {"role": "user", "content": user_message},
-            ],
+            messages=filter_messages(query),
             temperature=0.0,
         )
         # Call the Gemini model
@@ -86,5 +104,49 @@ def extract_filters(query: str) -> dict:
         print(f"Error parsing the response: {e}")
         return {}
 
+
+@alru_cache(maxsize=2048)
+async def _llm_extract_filters(query: str) -> dict:
+    """LLM extraction memoized per normalized query; failures raise and are therefore not cached."""
+    filter_extraction_counters["llm"] += 1
+    completion = await async_model.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=filter_messages(query),
+        temperature=0.0,
+    )
+    cleaned_json = clean_json_response(completion.choices[0].message.content)
+    return lowercase_dict(json.loads(cleaned_json))
+
+
+async def aextract_filters(query: str, timeout: float = None) -> dict:
+    """
+    Non-blocking version of `extract_filters` for use on the event loop.
+
+    Args:
+        query (str): The user's input query.
+        timeout (float): Seconds to wait for the LLM before searching without filters.
+
+    Returns:
+        dict: Extracted filters, or {} when the LLM fails or times out.
+    """
+    filters = parse_filters(query)
+    if filters is not None:
+        filter_extraction_counters["rules"] += 1
+        return filters
+
+    try:
+        filters = await asyncio.wait_for(
+            _llm_extract_filters(normalize_text(query)),
+            timeout=timeout or s.filter_extraction_timeout,
+        )
+        return dict(filters)
+    except asyncio.TimeoutError:
+        logger.warning(f"Filter extraction timed out for query: {query}")
+        return {}
+    except Exception as e:
+        logger.error(f"Error extracting filters: {e}")
+        return {}
+
+
 if __name__ == "__main__":
     print(extract_filters("I want a highly-rated music instrument under 100 dollars"))
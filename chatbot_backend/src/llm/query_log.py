@@ -0,0 +1,76 @@
+import json
+import logging
+import queue
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from pathlib import Path
+from typing import Optional
+
+from src.config import s
+from src.llm.embedding_cache import normalize_text
+
+# dedicated logger writing one JSON line per product search, read back by the startup warm-up
+query_logger = logging.getLogger("query_log")
+query_logger.propagate = False
+
+
+_listener: Optional[QueueListener] = None
+
+
+def _start_listener():
+    """
+    File writes happen on the listener's thread, never on the event loop. Every worker appends
+    to the same file, so rotation is left to an external tool (e.g. logrotate renaming it to
+    `<path>.1`); the handler reopens the file once it has been moved.
+    """
+    global _listener
+    s.query_log_path.parent.mkdir(parents=True, exist_ok=True)
+    handler = WatchedFileHandler(s.query_log_path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, handler)
+    _listener.start()
+    query_logger.addHandler(QueueHandler(log_queue))
+    query_logger.setLevel(logging.INFO)
+
+
+def record_query(query: str, filters: Optional[dict]):
+    """Log a search with the filters extracted for it, so the warm-up can replay it without the LLM."""
+    if _listener is None:
+        _start_listener()
+    query_logger.info(json.dumps({"query": query, "filters": filters or {}}))
+
+
+def stop_query_log():
+    """Write out the queued queries and stop the listener thread; called at shutdown."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    for handler in list(query_logger.handlers):
+        query_logger.removeHandler(handler)
+    _listener = None
+
+
+def top_queries(path: Path, n: int) -> list[tuple[str, dict]]:
+    """
+    The `n` most frequent queries in the log and its rotated backup, most frequent first, with
+    the filters last logged for them. Lines written before filters were logged are skipped.
+    """
+    counts, examples = Counter(), {}
+    for log_path in (Path(f"{path}.1"), Path(path)):
+        if not log_path.exists():
+            continue
+        with open(log_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    query, filters = entry["query"], entry["filters"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                key = normalize_text(query)
+                counts[key] += 1
+                examples[key] = query, filters
+    return [examples[key] for key, _ in counts.most_common(n)]
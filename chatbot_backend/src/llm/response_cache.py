@@ -0,0 +1,123 @@
+import json
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """
+    Cache of whole agent answers for stateless first turns, looked up by embedding similarity.
+
+    A cached answer is reused when the new message's embedding has cosine similarity of at
+    least `threshold` with a cached one, the extracted filters are identical, the entry is
+    younger than `ttl` and it was produced against the current catalogue version.
+
+    Lookups are split in two so the caller only extracts filters when some entry is similar
+    enough: `candidates` compares the vector, `lookup` checks the filters of the candidates.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, maxsize: int = 2000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, dict] = OrderedDict()
+        self._next_key = 0
+        # normalised vectors in insertion order, grown by doubling; rows of dropped entries
+        # stay until more than half the rows are stale and the matrix is compacted
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: list[int] = []
+        self.counters = {"hits": 0, "misses": 0, "stores": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _append_row(self, key: int, vector: np.ndarray):
+        rows = len(self._keys)
+        if self._matrix is None or self._matrix.shape[1] != len(vector):
+            self._matrix, self._keys, rows = np.empty((16, len(vector)), dtype=np.float32), [], 0
+        elif rows == len(self._matrix):
+            grown = np.empty((2 * rows, self._matrix.shape[1]), dtype=np.float32)
+            grown[:rows] = self._matrix
+            self._matrix = grown
+        self._matrix[rows] = vector
+        self._keys.append(key)
+
+    def _compact(self):
+        if len(self._keys) <= 2 * len(self._entries):
+            return
+        keys, self._keys = list(self._entries), []
+        for key in keys:
+            self._append_row(key, self._entries[key]["vector"])
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._compact()
+
+    def candidates(self, vector: List[float], catalog_version: str) -> list[int]:
+        """Keys of the live entries at least `threshold` similar to `vector`, most similar first."""
+        self._expire()
+        if not self._entries:
+            return []
+        similarities = self._matrix[: len(self._keys)] @ self._normalize(vector)
+        candidates = []
+        for pos in np.argsort(-similarities):
+            if similarities[pos] < self.threshold:
+                break
+            entry = self._entries.get(self._keys[pos])
+            if entry is not None and entry["catalog_version"] == catalog_version:
+                candidates.append(self._keys[pos])
+        return candidates
+
+    def lookup(self, candidates: list[int], filters: Optional[dict]) -> Optional[str]:
+        """The answer of the first candidate stored with the same filters, counted as a hit or miss."""
+        filters_key = json.dumps(filters or {}, sort_keys=True)
+        for key in candidates:
+            entry = self._entries.get(key)
+            if entry is not None and entry["filters"] == filters_key:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry["answer"]
+
+        self.counters["misses"] += 1
+        return None
+
+    def store(self, vector: List[float], filters: dict, answer: str, catalog_version: str):
+        key = self._next_key
+        self._next_key += 1
+        self._entries[key] = {
+            "vector": self._normalize(vector),
+            "filters": json.dumps(filters or {}, sort_keys=True),
+            "answer": answer,
+            "catalog_version": catalog_version,
+            "created_at": time.monotonic(),
+        }
+        self._append_row(key, self._entries[key]["vector"])
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        self._compact()
+        self.counters["stores"] += 1
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the catalogue was re-ingested."""
+        self._entries.clear()
+        self._matrix = None
+        self._keys = []
+
+    def stats(self) -> dict:
+        total = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": self.counters["hits"] / total if total else 0.0,
+            "size": len(self._entries),
+        }
@@ -2,6 +2,43 @@ from pydantic import BaseModel
 from typing import List, Optional
 import ast
 
+
+def safe_float(value: str) -> Optional[float]:
+    if not value or value.lower() == 'none':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def safe_int(value: str) -> Optional[int]:
+    if not value or value.lower() == 'none':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def safe_eval_list(value: str) -> Optional[List[str]]:
+    if not value or value.lower() == 'none':
+        return None
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return None
+
+
+def safe_eval_dict(value: str) -> Optional[dict]:
+    if not value or value.lower() == 'none':
+        return {}
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return {}
+
+
 class Product(BaseModel):
     main_category: str
     title: str
@@ -31,38 +68,6 @@ class Product(BaseModel):
         # Create a dictionary mapping headers to values
         data = dict(zip(headers, row))
         
-        def safe_float(value: str) -> Optional[float]:
-            if not value or value.lower() == 'none':
-                return None
-            try:
-                return float(value)
-            except ValueError:
-                return None
-
-        def safe_int(value: str) -> Optional[int]:
-            if not value or value.lower() == 'none':
-                return None
-            try:
-                return int(value)
-            except ValueError:
-                return None
-
-        def safe_eval_list(value: str) -> Optional[List[str]]:
-            if not value or value.lower() == 'none':
-                return None
-            try:
-                return ast.literal_eval(value)
-            except (ValueError, SyntaxError):
-                return None
-
-        def safe_eval_dict(value: str) -> Optional[dict]:
-            if not value or value.lower() == 'none':
-                return {}
-            try:
-                return ast.literal_eval(value)
-            except (ValueError, SyntaxError):
-                return {}
-
         product_data = {
             'main_category': data.get('main_category', ''),
             'title': data.get('title', ''),
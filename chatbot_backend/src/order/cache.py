@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Size-bounded async response cache with per-call TTLs and stale-while-revalidate.
+
+    Fresh entries are returned as is; entries past their TTL but inside the stale window are
+    returned immediately while one background task refreshes them; anything older is
+    fetched inline. Least recently used entries are evicted past `maxsize`.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[Any, float, float]] = OrderedDict()
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self.counters: dict[str, dict[str, int]] = defaultdict(lambda: {"hits": 0, "stale_hits": 0, "misses": 0})
+
+    def _store(self, key: str, value: Any, ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self._entries[key] = (value, now + ttl, now + ttl + stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float):
+        try:
+            self._store(key, await fetch(), ttl, stale_ttl)
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed, serving stale value: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_fetch(
+        self,
+        endpoint: str,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: float = 0.0,
+    ):
+        """Return the cached value of `key` or call `fetch`; hits and misses are counted under `endpoint`."""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            value, expires_at, stale_until = entry
+            if now < expires_at:
+                self._entries.move_to_end(key)
+                self.counters[endpoint]["hits"] += 1
+                return value
+            if now < stale_until:
+                self._entries.move_to_end(key)
+                self.counters[endpoint]["stale_hits"] += 1
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, fetch, ttl, stale_ttl))
+                return value
+
+        self.counters[endpoint]["misses"] += 1
+        value = await fetch()
+        self._store(key, value, ttl, stale_ttl)
+        return value
+
+    def invalidate(self, prefix: str = ""):
+        """Drop every entry whose key starts with `prefix` (everything by default)."""
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        endpoints = {}
+        for endpoint, counts in self.counters.items():
+            total = sum(counts.values())
+            hits = counts["hits"] + counts["stale_hits"]
+            endpoints[endpoint] = {**counts, "hit_ratio": hits / total if total else 0.0}
+        return {"size": len(self._entries), "endpoints": endpoints}
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Optional
+from urllib.parse import urlencode
+
+import httpx
+
+from src.config import s
+
+logger = logging.getLogger(__name__)
+
+
+class OrderClient:
+    """
+    Shared HTTP client for the order service.
+
+    One pooled `httpx.AsyncClient` (HTTP/2, keep-alive) is reused for every call instead of a
+    new TCP/TLS connection per tool call. Concurrent identical GETs are coalesced onto a
+    single upstream request, and transient failures are retried with backoff.
+    """
+
+    def __init__(self, base_url: str, timeout: float, retries: int, max_connections: int):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=True,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=30.0,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get(self, path: str, params: Optional[dict], timeout: Optional[float]):
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.get(path, params=params, timeout=timeout or self.timeout)
+                if response.status_code < 500 or attempt == self.retries:
+                    response.raise_for_status()
+                    return response.json()
+                logger.warning(f"Order service {path} returned {response.status_code}, retrying")
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Order service {path} failed ({e.__class__.__name__}), retrying")
+            await asyncio.sleep(0.2 * 2**attempt)
+
+    async def get_json(self, path: str, params: Optional[dict] = None, timeout: Optional[float] = None):
+        """GET `path` and return the decoded JSON; identical in-flight requests share one upstream call."""
+        key = f"{path}?{urlencode(sorted((params or {}).items()))}"
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._get(path, params, timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: a cancelled caller must not cancel the request other callers are waiting on
+        return await asyncio.shield(task)
+
+
+order_client = OrderClient(
+    s.order_host,
+    timeout=s.order_timeout,
+    retries=s.order_retries,
+    max_connections=s.order_max_connections,
+)
@@ -1,68 +1,106 @@
-import httpx
+import logging
+from typing import AsyncIterator, Optional
+
 from src.config import s
+from src.order.cache import TTLCache
+from src.order.client import order_client
+
+# (ttl, stale-while-revalidate window) in seconds per endpoint. The order service is read-only
+# to the chatbot and sends no change notifications, so these windows bound how stale an answer
+# can be: a change shows up at most ttl + stale window later (60 s for customer orders).
+ENDPOINT_TTLS = {
+    "customer_orders": (30, 30),
+    "customer_data": (30, 30),
+    "product_category": (120, 120),
+    "order_priority": (120, 120),
+    "total_sales_by_category": (300, 300),
+    "high_profit_products": (300, 300),
+    "shipping_cost_summary": (300, 300),
+    "profit_by_gender": (300, 300),
+}
+
+logger = logging.getLogger(__name__)
+
+order_cache = TTLCache(maxsize=s.order_cache_size)
+
+
+async def _cached_get(endpoint: str, path: str, params: dict = None):
+    ttl, stale_ttl = ENDPOINT_TTLS[endpoint]
+    key = f"{path}?{sorted((params or {}).items())}"
+    return await order_cache.get_or_fetch(
+        endpoint, key, lambda: order_client.get_json(path, params=params), ttl, stale_ttl
+    )
+
+
+async def iter_pages(
+    path: str, params: dict = None, page_size: int = 500, fields: Optional[list[str]] = None
+) -> AsyncIterator[dict]:
+    """
+    Iterate over the rows of a paginated order service list endpoint one page at a time,
+    so a full table is never held in memory.
+
+    An error payload on the first page is the service's "no data found" answer and ends an
+    empty scan; one on a later page raises RuntimeError, so a truncated scan is never
+    mistaken for a complete one.
+    """
+    params = dict(params or {}, limit=page_size)
+    if fields:
+        params["fields"] = ",".join(fields)
+    while True:
+        page = await order_client.get_json(path, params=params)
+        if "error" in page:
+            if "cursor" in params:
+                raise RuntimeError(f"Order service {path} failed after cursor {params['cursor']}: {page['error']}")
+            logger.info(f"Order service {path}: {page['error']}")
+            return
+        for row in page["items"]:
+            yield row
+        if not page["next_cursor"]:
+            return
+        params["cursor"] = page["next_cursor"]
+
 
 async def list_orders_by_customer_id(customer_id: str):
     """
     List all orders for a given customer ID by calling the order service REST API.
     """
-    url = f"{s.order_host}/data/customer/{customer_id}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    return await _cached_get("customer_orders", f"/data/customer/{customer_id}")
 
 async def get_all_data():
-    url = f"{s.order_host}/data"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    return await order_client.get_json("/data")
+
+def iter_all_data(page_size: int = 500, fields: Optional[list[str]] = None) -> AsyncIterator[dict]:
+    return iter_pages("/data", page_size=page_size, fields=fields)
 
 async def get_customer_data(customer_id: int):
-    url = f"{s.order_host}/data/customer/{customer_id}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    return await _cached_get("customer_data", f"/data/customer/{customer_id}")
 
 async def get_product_category_data(category: str):
-    url = f"{s.order_host}/data/product-category/{category}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    return await _cached_get("product_category", f"/data/product-category/{category}")
+
+def iter_product_category_data(
+    category: str, page_size: int = 500, fields: Optional[list[str]] = None
+) -> AsyncIterator[dict]:
+    return iter_pages(f"/data/product-category/{category}", page_size=page_size, fields=fields)
 
 async def get_orders_by_priority(priority: str):
-    url = f"{s.order_host}/data/order-priority/{priority}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    return await _cached_get("order_priority", f"/data/order-priority/{priority}")
 
 async def total_sales_by_category():
-    url = f"{s.order_host}/data/total-sales-by-category"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    return await _cached_get("total_sales_by_category", "/data/total-sales-by-category")
 
 async def high_profit_products(min_profit: float = 100.0):
-    url = f"{s.order_host}/data/high-profit-products?min_profit={min_profit}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    return await _cached_get("high_profit_products", "/data/high-profit-products", params={"min_profit": min_profit})
+
+def iter_high_profit_products(
+    min_profit: float = 100.0, page_size: int = 500, fields: Optional[list[str]] = None
+) -> AsyncIterator[dict]:
+    return iter_pages(
+        "/data/high-profit-products", params={"min_profit": min_profit}, page_size=page_size, fields=fields
+    )
 
 async def shipping_cost_summary():
-    url = f"{s.order_host}/data/shipping-cost-summary"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    return await _cached_get("shipping_cost_summary", "/data/shipping-cost-summary")
 
 async def profit_by_gender():
-    url = f"{s.order_host}/data/profit-by-gender"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    return await _cached_get("profit_by_gender", "/data/profit-by-gender")
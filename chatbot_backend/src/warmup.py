@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+import time
+
+from src.config import s
+from src.database.pinecone_client import pineconeClient
+from src.llm.chatbot import get_agent
+from src.llm.checkpointer import get_checkpointer
+from src.llm.embedding import embed_queries
+from src.llm.query_log import top_queries
+from src.order.client import order_client
+
+logger = logging.getLogger(__name__)
+
+SETUP_RETRY_DELAY = 10  # seconds between attempts while a dependency is unreachable
+ORDER_PROBE_TIMEOUT = 2.0  # seconds; the probe fetches a single order
+
+# flipped by `warm_up`; served by the readiness endpoint
+readiness = {"ready": False, "status": "warming_up", "started_at": time.time(), "warmup": {}}
+
+
+async def _preload(query: str, filters: dict, semaphore: asyncio.Semaphore):
+    """
+    Fill the search caches for `query` the way `search_product` will hit them, with the filters
+    logged for it; no filter extraction (and so no LLM call) happens during the warm-up.
+    """
+    async with semaphore:
+        await pineconeClient.search(query, "products", json.dumps(filters or {}))
+
+
+async def _setup(stats: dict):
+    """
+    Build the agent on the conversation store opened by the lifespan, check the order service
+    with a one-row request over the pooled client and open the vector index channel.
+    """
+    get_agent()
+    await order_client.get_json("/data", params={"limit": 1}, timeout=ORDER_PROBE_TIMEOUT)
+    stats["sessions"] = (await get_checkpointer().astats())["active_sessions"]
+    stats["vectors"] = await asyncio.to_thread(pineconeClient.warmup, "products")
+
+
+async def _replay(stats: dict):
+    """Replay the most frequent logged searches so the first requests hit warm caches."""
+    logged = await asyncio.to_thread(top_queries, s.query_log_path, s.warmup_queries)
+    stats["queries"] = len(logged)
+    if not logged:
+        return
+    try:
+        # one embeddings request for every query not already in the embedding cache
+        await embed_queries([query for query, _ in logged])
+    except Exception as e:
+        logger.warning(f"Batch embedding of logged queries failed, embedding them one by one: {e}")
+    semaphore = asyncio.Semaphore(s.warmup_concurrency)
+    results = await asyncio.gather(
+        *(_preload(query, filters, semaphore) for query, filters in logged), return_exceptions=True
+    )
+    stats["failed_queries"] = sum(isinstance(result, Exception) for result in results)
+
+
+async def warm_up():
+    """
+    Startup work done before the worker reports ready. Until the agent, the order service
+    pool, the conversation store and the vector index are all reachable the worker reports
+    "degraded" (503) and setup is retried; after that, failures replaying individual
+    logged searches are counted but do not block readiness.
+    """
+    started = time.monotonic()
+    stats = readiness["warmup"]
+    while True:
+        try:
+            await _setup(stats)
+            break
+        except Exception as e:
+            logger.exception(f"Warm-up setup failed, retrying in {SETUP_RETRY_DELAY}s")
+            readiness["status"] = "degraded"
+            stats["error"] = str(e)
+            await asyncio.sleep(SETUP_RETRY_DELAY)
+    stats.pop("error", None)
+
+    try:
+        await _replay(stats)
+    except Exception as e:
+        logger.exception("Replaying logged searches failed, serving with cold caches")
+        stats["replay_error"] = str(e)
+    stats["seconds"] = round(time.monotonic() - started, 2)
+    readiness.update(ready=True, status="ready")
+    logger.info(f"Warm-up done: {stats}")
@@ -0,0 +1,64 @@
+"""
+One-time conversion of Order_Data_Dataset.csv to an Arrow IPC file that mock_api.py memory-maps at startup,
+plus the JSON encoding of every row (a JSON array and the byte offset of each row) it serves from.
+
+    python3 mock_api/convert_dataset.py
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATH = f"{DIR}/Order_Data_Dataset.csv"
+ARROW_PATH = f"{DIR}/Order_Data_Dataset.arrow"
+ROWS_JSON_PATH = f"{DIR}/Order_Data_Dataset.rows.json"
+ROW_OFFSETS_PATH = f"{DIR}/Order_Data_Dataset.rows.offsets.npy"
+
+# text columns with at most this share of distinct values are stored dictionary-encoded
+CATEGORY_MAX_RATIO = 0.5
+
+
+def write_rows_json(df: pd.DataFrame, rows_json_path: str = ROWS_JSON_PATH, offsets_path: str = ROW_OFFSETS_PATH):
+    """
+    Write the rows as one JSON array, so the unfiltered /data response is the file itself, and
+    the offset of each row: row i is bytes [offsets[i], offsets[i + 1] - 1), then a "," or "]".
+    """
+    rows = [row.encode("utf-8") for row in df.to_json(orient="records", lines=True, double_precision=15).splitlines()]
+    offsets = np.empty(len(rows) + 1, dtype=np.int64)
+    offsets[0] = 1
+    offsets[1:] = 1 + np.cumsum([len(row) + 1 for row in rows])
+    with open(rows_json_path, "wb") as f:
+        f.write(b"[" + b",".join(rows) + b"]")
+    np.save(offsets_path, offsets)
+    print(f"Wrote the JSON of {len(rows)} rows to {rows_json_path}")
+
+
+def convert(csv_path: str = CSV_PATH, arrow_path: str = ARROW_PATH):
+    df = pd.read_csv(csv_path)
+    # same cleaning mock_api.py applied on every start
+    df.fillna(value="", inplace=True)
+
+    for column in df.columns:
+        if df[column].dtype != object and not pd.api.types.is_string_dtype(df[column]):
+            continue
+        values = df[column].astype(str)
+        if values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+            df[column] = values.astype(pd.CategoricalDtype(sorted(values.unique())))
+        else:
+            df[column] = values
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # uncompressed IPC file, so readers can memory-map it without decoding
+    with pa.OSFile(arrow_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    print(f"Wrote {len(df)} rows to {arrow_path}")
+    print(table.schema)
+    # encoded from the table as mock_api loads it, so the JSON matches the on-demand encoding
+    write_rows_json(table.to_pandas(split_blocks=True))
+
+
+if __name__ == "__main__":
+    convert()
@@ -1,83 +1,255 @@
-from fastapi import FastAPI
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, Response, StreamingResponse
+import numpy as np
 import pandas as pd
+import mmap
 import os
+import re
 # Load dataset
 DATASET_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/Order_Data_Dataset.csv"
-df = pd.read_csv(DATASET_PATH)
+ARROW_DATASET_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/Order_Data_Dataset.arrow"
+ROWS_JSON_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/Order_Data_Dataset.rows.json"
+ROW_OFFSETS_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/Order_Data_Dataset.rows.offsets.npy"
+
+
+def load_dataset() -> pd.DataFrame:
+    """
+    Load the dataset from the Arrow IPC file written by convert_dataset.py when present.
+
+    The file is memory-mapped read-only: numeric columns are used zero-copy from the shared
+    page cache and category columns come back as compact pandas categoricals, so workers
+    skip the CSV parse. Falls back to parsing and cleaning the CSV.
+    """
+    if os.path.exists(ARROW_DATASET_PATH):
+        import pyarrow as pa
+
+        source = pa.memory_map(ARROW_DATASET_PATH, "r")
+        table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True)
+
+    data = pd.read_csv(DATASET_PATH)
+    # Clean data (e.g., handle NaN values) at the start
+    data.fillna(value="", inplace=True)
+    return data
+
+
+df = load_dataset()
+
+
+def load_rows_json() -> tuple[Optional[mmap.mmap], Optional[np.ndarray]]:
+    """
+    Memory-map the row JSON written by convert_dataset.py next to the Arrow file, so workers
+    share its pages instead of each encoding the dataset at import. (None, None) without it.
+    """
+    if not (os.path.exists(ARROW_DATASET_PATH) and os.path.exists(ROWS_JSON_PATH) and os.path.exists(ROW_OFFSETS_PATH)):
+        return None, None
+    offsets = np.load(ROW_OFFSETS_PATH, mmap_mode="r")
+    if len(offsets) != len(df) + 1:
+        return None, None  # left over from another dataset, re-run convert_dataset.py
+    with open(ROWS_JSON_PATH, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), offsets
+
+
+ROWS_JSON, ROW_OFFSETS = load_rows_json()
 
 # Initialize FastAPI app
 app = FastAPI(title="E-commerce Dataset API", description="API for querying e-commerce sales data")
 
-# Clean data (e.g., handle NaN values) at the start
-df.fillna(value="", inplace=True)
+# Precompute everything the endpoints need once, so requests never scan the whole DataFrame.
+# Responses are assembled by joining the JSON of the selected rows.
+ALL_POSITIONS = np.arange(len(df))
+
+# Customer_Id -> row positions
+CUSTOMER_INDEX = df.groupby("Customer_Id", sort=False, observed=True).indices
+
+
+def build_inverted_index(column: str) -> dict[str, np.ndarray]:
+    """Lowercase distinct value -> row positions of a low-cardinality text column."""
+    return dict(df.groupby(df[column].astype(str).str.lower(), sort=False).indices)
+
+
+CATEGORY_INDEX = build_inverted_index("Product_Category")
+PRIORITY_INDEX = build_inverted_index("Order_Priority")
+
+# rows sorted by profit, for range lookups with a binary search
+PROFIT = df["Profit"].to_numpy(dtype=float)
+PROFIT_ORDER = np.argsort(PROFIT, kind="stable")
+PROFIT_SORTED = PROFIT[PROFIT_ORDER]
+
+# Materialized aggregates
+TOTAL_SALES_BY_CATEGORY = df.groupby("Product_Category", observed=True)["Sales"].sum().reset_index().to_dict(orient="records")
+SHIPPING_COST_SUMMARY = {
+    "average_shipping_cost": float(df["Shipping_Cost"].mean()),
+    "min_shipping_cost": float(df["Shipping_Cost"].min()),
+    "max_shipping_cost": float(df["Shipping_Cost"].max())
+}
+PROFIT_BY_GENDER = df.groupby("Gender", observed=True)["Profit"].sum().reset_index().to_dict(orient="records")
+
+
+def search_inverted_index(index: dict[str, np.ndarray], pattern: str) -> np.ndarray:
+    """Same matching as `str.contains(pattern, case=False)`, evaluated on the distinct values only."""
+    regex = re.compile(pattern, re.IGNORECASE)
+    matches = [positions for value, positions in index.items() if regex.search(value)]
+    if not matches:
+        return np.array([], dtype=np.intp)
+    return np.sort(np.concatenate(matches))
+
+
+def records_response(positions) -> Response:
+    return Response(
+        content="[" + ",".join(encode_rows(positions, None)) + "]",
+        media_type="application/json",
+    )
+
+
+NDJSON_CHUNK_SIZE = 1000  # rows encoded per streamed chunk
+
+
+def encode_rows(positions, fields: Optional[list[str]]) -> list[str]:
+    """
+    JSON of the selected rows, projected to `fields` when given. Whole rows are sliced from
+    the memory-mapped row JSON when present; anything else is encoded for this request only.
+    """
+    if not fields and ROWS_JSON is not None:
+        return [ROWS_JSON[ROW_OFFSETS[i] : ROW_OFFSETS[i + 1] - 1].decode("utf-8") for i in positions]
+    if not len(positions):
+        return []
+    rows = df.iloc[positions] if not fields else df.iloc[positions][fields]
+    return rows.to_json(orient="records", lines=True, double_precision=15).splitlines()
+
+
+def list_response(
+    positions,
+    limit: Optional[int],
+    cursor: Optional[str],
+    fields: Optional[str],
+    format: str,
+) -> Response:
+    """
+    Serve a selection of rows.
+
+    Without `limit`/`cursor` the whole selection is returned as a JSON array (the original
+    response). With them, one page is returned as {"items": [...], "next_cursor": ...}; the
+    cursor is opaque to clients. `fields` projects columns and `format=ndjson` streams one
+    row per line, encoded in chunks (the next cursor then goes in the X-Next-Cursor header).
+    """
+    projection = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    unknown = set(projection or []) - set(df.columns)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+    try:
+        start = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if start < 0 or (limit is not None and limit <= 0):
+        raise HTTPException(status_code=400, detail="Invalid cursor or limit")
+
+    paged = limit is not None or cursor is not None
+    end = min(start + limit, len(positions)) if limit is not None else len(positions)
+    page = positions[start:end]
+    next_cursor = str(end) if paged and end < len(positions) else None
+
+    if format == "ndjson":
+        def generate():
+            for i in range(0, len(page), NDJSON_CHUNK_SIZE):
+                yield "\n".join(encode_rows(page[i:i + NDJSON_CHUNK_SIZE], projection)) + "\n"
+
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return StreamingResponse(generate(), media_type="application/x-ndjson", headers=headers)
+
+    items = "[" + ",".join(encode_rows(page, projection)) + "]"
+    if not paged:
+        return Response(content=items, media_type="application/json")
+    next_cursor_json = f'"{next_cursor}"' if next_cursor else "null"
+    return Response(
+        content=f'{{"items":{items},"next_cursor":{next_cursor_json}}}',
+        media_type="application/json",
+    )
+
 
 # Endpoint to get all data
 @app.get("/data")
-def get_all_data():
+def get_all_data(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+):
     """Retrieve all records in the dataset."""
-    return df.to_dict(orient="records")
+    if limit is None and cursor is None and fields is None and format == "json":
+        if ROWS_JSON is not None:
+            return FileResponse(ROWS_JSON_PATH, media_type="application/json")
+        return records_response(ALL_POSITIONS)
+    return list_response(ALL_POSITIONS, limit, cursor, fields, format)
 
 # Endpoint to filter data by Customer ID
 @app.get("/data/customer/{customer_id}")
 def get_customer_data(customer_id: int):
     """Retrieve all records for a specific Customer ID."""
-    filtered_data = df[df["Customer_Id"] == customer_id]
-    if filtered_data.empty:
+    positions = CUSTOMER_INDEX.get(customer_id)
+    if positions is None:
         return {"error": f"No data found for Customer ID {customer_id}"}
-    return filtered_data.to_dict(orient="records")
+    return records_response(positions)
 
 # Endpoint to filter data by Product Category
 @app.get("/data/product-category/{category}")
-def get_product_category_data(category: str):
+def get_product_category_data(
+    category: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+):
     """Retrieve all records for a specific Product Category."""
-    filtered_data = df[df["Product_Category"].str.contains(category, case=False, na=False)]
-    if filtered_data.empty:
+    positions = search_inverted_index(CATEGORY_INDEX, category)
+    if not len(positions):
         return {"error": f"No data found for Product Category '{category}'"}
-    return filtered_data.to_dict(orient="records")
+    return list_response(positions, limit, cursor, fields, format)
 
 # Endpoint to get orders with specific priorities
 @app.get("/data/order-priority/{priority}")
 def get_orders_by_priority(priority: str):
     """Retrieve all orders with the given priority."""
-    filtered_data = df[df["Order_Priority"].str.contains(priority, case=False, na=False)]
-    if filtered_data.empty:
+    positions = search_inverted_index(PRIORITY_INDEX, priority)
+    if not len(positions):
         return {"error": f"No data found for Order Priority '{priority}'"}
-    return filtered_data.to_dict(orient="records")
+    return records_response(positions)
 
 # Endpoint to calculate total sales by Product Category
 @app.get("/data/total-sales-by-category")
 def total_sales_by_category():
     """Calculate total sales by Product Category."""
-    sales_summary = df.groupby("Product_Category")["Sales"].sum().reset_index()
-    return sales_summary.to_dict(orient="records")
+    return TOTAL_SALES_BY_CATEGORY
 
 # Endpoint to get high-profit products
 @app.get("/data/high-profit-products")
-def high_profit_products(min_profit: float = 100.0):
+def high_profit_products(
+    min_profit: float = 100.0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+):
     """Retrieve products with profit greater than the specified value."""
-    filtered_data = df[df["Profit"] > min_profit]
-    if filtered_data.empty:
+    start = np.searchsorted(PROFIT_SORTED, min_profit, side="right")
+    if start == len(PROFIT_SORTED):
         return {"error": f"No products found with profit greater than {min_profit}"}
-    return filtered_data.to_dict(orient="records")
+    return list_response(np.sort(PROFIT_ORDER[start:]), limit, cursor, fields, format)
 
 # Endpoint to get shipping cost summary
 @app.get("/data/shipping-cost-summary")
 def shipping_cost_summary():
     """Retrieve the average, minimum, and maximum shipping cost."""
-    summary = {
-        "average_shipping_cost": df["Shipping_Cost"].mean(),
-        "min_shipping_cost": df["Shipping_Cost"].min(),
-        "max_shipping_cost": df["Shipping_Cost"].max()
-    }
-    return summary
+    return SHIPPING_COST_SUMMARY
 
 # Endpoint to calculate total profit by Gender
 @app.get("/data/profit-by-gender")
 def profit_by_gender():
     """Calculate total profit by customer gender."""
-    profit_summary = df.groupby("Gender")["Profit"].sum().reset_index()
-    return profit_summary.to_dict(orient="records")
+    return PROFIT_BY_GENDER
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)